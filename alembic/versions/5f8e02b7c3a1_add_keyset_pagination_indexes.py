@@ -0,0 +1,43 @@
+"""Add (sort key, id) indexes for keyset pagination
+
+Revision ID: 5f8e02b7c3a1
+Revises: d41c7a9e2b06
+Create Date: 2026-10-17 13:38:05.774102
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f8e02b7c3a1'
+down_revision: Union[str, None] = 'd41c7a9e2b06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# New index -> (columns, the index it supersedes as a prefix, that index's columns)
+INDEXES = {
+    'ix_posts_created_at_id': (['created_at', 'id'], 'ix_posts_created_at', ['created_at']),
+    'ix_posts_course_id_created_at_id': (['course_id', 'created_at', 'id'], 'ix_posts_course_id_created_at', ['course_id', 'created_at']),
+    'ix_posts_like_count_id': (['like_count', 'id'], 'ix_posts_like_count', ['like_count']),
+    'ix_posts_course_id_like_count_id': (['course_id', 'like_count', 'id'], 'ix_posts_course_id_like_count', ['course_id', 'like_count']),
+}
+
+
+def upgrade() -> None:
+    # Build the replacements before dropping the old indexes, so listings never lose index coverage
+    with op.get_context().autocommit_block():
+        for name, (columns, _, _) in INDEXES.items():
+            op.create_index(name, 'posts', columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for _, (_, old_name, _) in INDEXES.items():
+            op.drop_index(old_name, table_name='posts', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for _, (_, old_name, old_columns) in INDEXES.items():
+            op.create_index(old_name, 'posts', old_columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name in INDEXES:
+            op.drop_index(name, table_name='posts', postgresql_concurrently=True, if_exists=True)
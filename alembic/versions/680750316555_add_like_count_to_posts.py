@@ -0,0 +1,43 @@
+"""Add like_count to posts
+
+Revision ID: 680750316555
+Revises: 7e48e794e298
+Create Date: 2026-10-17 09:12:41.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '680750316555'
+down_revision: Union[str, None] = '7e48e794e298'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing likes
+    op.execute("""
+        UPDATE posts
+        SET like_count = likes.like_count
+        FROM (
+            SELECT post_id, COUNT(*) AS like_count
+            FROM post_likes
+            GROUP BY post_id
+        ) AS likes
+        WHERE posts.id = likes.post_id
+    """)
+
+    op.create_index(op.f('ix_posts_like_count'), 'posts', ['like_count'], unique=False)
+    op.create_index('ix_posts_course_id_like_count', 'posts', ['course_id', 'like_count'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_course_id_like_count', table_name='posts')
+    op.drop_index(op.f('ix_posts_like_count'), table_name='posts')
+    op.drop_column('posts', 'like_count')
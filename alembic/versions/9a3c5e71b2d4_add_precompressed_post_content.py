@@ -0,0 +1,45 @@
+"""Add a precompressed copy of post content
+
+Revision ID: 9a3c5e71b2d4
+Revises: 5f8e02b7c3a1
+Create Date: 2026-10-17 16:02:19.418230
+
+"""
+import gzip
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3c5e71b2d4'
+down_revision: Union[str, None] = '5f8e02b7c3a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Posts compressed per committed batch while backfilling
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    # A nullable column without a default is a catalog-only change; rows written by older code stay NULL and are served uncompressed
+    op.add_column('posts', sa.Column('content_gzip', sa.LargeBinary(), nullable=True))
+
+    # Backfill in small committed batches so no transaction holds row locks on the whole table
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        while True:
+            rows = conn.execute(
+                sa.text("SELECT id, content_md FROM posts WHERE content_gzip IS NULL LIMIT :limit"), {"limit": BATCH_SIZE}
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                sa.text("UPDATE posts SET content_gzip = :content_gzip WHERE id = :id"),
+                [{"id": post_id, "content_gzip": gzip.compress(content_md.encode(), compresslevel=9, mtime=0)} for post_id, content_md in rows],
+            )
+
+
+def downgrade() -> None:
+    op.drop_column('posts', 'content_gzip')
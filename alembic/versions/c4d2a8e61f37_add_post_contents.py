@@ -0,0 +1,111 @@
+"""Move post bodies into post_contents (expand and backfill)
+
+Revision ID: c4d2a8e61f37
+Revises: 9a3c5e71b2d4
+Create Date: 2026-10-17 18:40:52.106913
+
+First half of an online move; `e7f1b3c9d5a2` drops the old columns. To deploy without downtime:
+1. `alembic upgrade c4d2a8e61f37` while the old code is still running (it keeps writing `posts.content_md`)
+2. deploy the code that reads and writes `post_contents`
+3. `alembic upgrade head`, which drops the sync triggers and the columns
+
+Until step 3, triggers keep both copies of a body in step, so old and new code running side by side
+(during the deploy, or a rollback) each find every post's body where they look for it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2a8e61f37'
+down_revision: Union[str, None] = '9a3c5e71b2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Posts copied per committed batch while backfilling
+BATCH_SIZE = 1000
+
+# Bodies written by either version of the code are copied to the other table. Each copy only writes
+# a changed body, so the trigger it fires on the other table finds nothing to do and the ping-pong stops.
+CREATE_SYNC_TRIGGERS = """
+    CREATE FUNCTION posts_sync_content() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NEW.content_md IS NOT NULL THEN
+            INSERT INTO post_contents (post_id, content_md, content_gzip)
+            VALUES (NEW.id, NEW.content_md, NEW.content_gzip)
+            ON CONFLICT (post_id) DO UPDATE
+            SET content_md = EXCLUDED.content_md, content_gzip = EXCLUDED.content_gzip
+            WHERE (post_contents.content_md, post_contents.content_gzip) IS DISTINCT FROM (EXCLUDED.content_md, EXCLUDED.content_gzip);
+        END IF;
+        RETURN NULL;
+    END $$;
+
+    CREATE FUNCTION post_contents_sync_post() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE posts SET content_md = NEW.content_md, content_gzip = NEW.content_gzip
+        WHERE id = NEW.post_id AND (content_md, content_gzip) IS DISTINCT FROM (NEW.content_md, NEW.content_gzip);
+        RETURN NULL;
+    END $$;
+
+    CREATE TRIGGER posts_sync_content AFTER INSERT OR UPDATE OF content_md, content_gzip ON posts
+        FOR EACH ROW EXECUTE FUNCTION posts_sync_content();
+    CREATE TRIGGER post_contents_sync_post AFTER INSERT OR UPDATE ON post_contents
+        FOR EACH ROW EXECUTE FUNCTION post_contents_sync_post();
+"""
+
+DROP_SYNC_TRIGGERS = """
+    DROP TRIGGER IF EXISTS post_contents_sync_post ON post_contents;
+    DROP TRIGGER IF EXISTS posts_sync_content ON posts;
+    DROP FUNCTION IF EXISTS post_contents_sync_post();
+    DROP FUNCTION IF EXISTS posts_sync_content();
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        'post_contents',
+        sa.Column('post_id', sa.String(), nullable=False),
+        sa.Column('content_md', sa.String(), nullable=False),
+        sa.Column('content_gzip', sa.LargeBinary(), nullable=True),
+        sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ),
+        sa.PrimaryKeyConstraint('post_id')
+    )
+    # The new code inserts posts without a body; dropping NOT NULL is a catalog-only change
+    op.alter_column('posts', 'content_md', existing_type=sa.String(), nullable=True)
+    # Before the backfill, so posts the old code writes while it runs are copied too
+    op.execute(CREATE_SYNC_TRIGGERS)
+
+    # Copy in primary key order, in small committed batches, so no transaction holds locks on the whole table
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        after = ""
+        while True:
+            last = conn.execute(
+                sa.text("SELECT max(id) FROM (SELECT id FROM posts WHERE id > :after ORDER BY id LIMIT :limit) AS batch"),
+                {"after": after, "limit": BATCH_SIZE},
+            ).scalar()
+            if last is None:
+                break
+            conn.execute(
+                sa.text("""
+                    INSERT INTO post_contents (post_id, content_md, content_gzip)
+                    SELECT id, content_md, content_gzip FROM posts
+                    WHERE id > :after AND id <= :last AND content_md IS NOT NULL
+                    ON CONFLICT (post_id) DO NOTHING
+                """),
+                {"after": after, "last": last},
+            )
+            after = last
+
+
+def downgrade() -> None:
+    op.execute(DROP_SYNC_TRIGGERS)
+    # Posts created by the new code have their body only in post_contents
+    op.execute("""
+        UPDATE posts SET content_md = post_contents.content_md, content_gzip = post_contents.content_gzip
+        FROM post_contents WHERE post_contents.post_id = posts.id AND posts.content_md IS NULL
+    """)
+    op.alter_column('posts', 'content_md', existing_type=sa.String(), nullable=False)
+    op.drop_table('post_contents')
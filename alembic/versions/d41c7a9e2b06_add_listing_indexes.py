@@ -0,0 +1,45 @@
+"""Add indexes for the listing queries
+
+Revision ID: d41c7a9e2b06
+Revises: 680750316555
+Create Date: 2026-10-17 11:04:27.518330
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41c7a9e2b06'
+down_revision: Union[str, None] = '680750316555'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns). fav_courses(user_id) is already served by its (user_id, course_id) primary key.
+INDEXES = [
+    ('ix_posts_course_id_created_at', 'posts', ['course_id', 'created_at']),
+    ('ix_posts_created_at', 'posts', ['created_at']),
+    ('ix_post_likes_post_id', 'post_likes', ['post_id']),
+    ('ix_post_comments_post_id_created_at', 'post_comments', ['post_id', 'created_at']),
+    ('ix_courses_topic_id', 'courses', ['topic_id']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the tables writable while the indexes build, but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+        # Superseded by ix_post_comments_post_id_created_at (same leading column)
+        op.drop_index('ix_post_comments_post_id', table_name='post_comments', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_post_comments_post_id', 'post_comments', ['post_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,49 @@
+"""Drop the post body columns from posts (contract)
+
+Revision ID: e7f1b3c9d5a2
+Revises: c4d2a8e61f37
+Create Date: 2026-10-17 18:41:37.554120
+
+Second half of the move started in `c4d2a8e61f37`; run it once no code reading `posts.content_md` is left.
+"""
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7f1b3c9d5a2'
+down_revision: Union[str, None] = 'c4d2a8e61f37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The sync triggers `c4d2a8e61f37` installs (revision files are not importable by name)
+_spec = spec_from_file_location("c4d2a8e61f37", Path(__file__).with_name("c4d2a8e61f37_add_post_contents.py"))
+expand = module_from_spec(_spec)
+_spec.loader.exec_module(expand)
+
+
+def upgrade() -> None:
+    op.execute(expand.DROP_SYNC_TRIGGERS)
+    # Posts the old code wrote after the backfill; the sync trigger copied them already, this is a safety net
+    op.execute("""
+        INSERT INTO post_contents (post_id, content_md, content_gzip)
+        SELECT id, content_md, content_gzip FROM posts
+        WHERE content_md IS NOT NULL AND NOT EXISTS (SELECT 1 FROM post_contents WHERE post_contents.post_id = posts.id)
+    """)
+    op.drop_column('posts', 'content_gzip')
+    op.drop_column('posts', 'content_md')
+
+
+def downgrade() -> None:
+    # Back to the expanded schema: the columns return empty (nullable) and are filled from post_contents
+    op.add_column('posts', sa.Column('content_md', sa.String(), nullable=True))
+    op.add_column('posts', sa.Column('content_gzip', sa.LargeBinary(), nullable=True))
+    op.execute("""
+        UPDATE posts SET content_md = post_contents.content_md, content_gzip = post_contents.content_gzip
+        FROM post_contents WHERE post_contents.post_id = posts.id
+    """)
+    op.execute(expand.CREATE_SYNC_TRIGGERS)
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple
+
+# How long a worker may serve the cached catalog before reloading it. Writes through this
+# worker invalidate it at once; the TTL bounds staleness for writes made elsewhere
+# (other workers, `python -m app.importer`, manual SQL).
+CATALOG_CACHE_SECONDS = float(os.getenv("CATALOG_CACHE_SECONDS", "300"))
+
+# Per-user liked posts and favorite courses: how many users each worker keeps, and for how long.
+# Writes through this worker update the cached sets; the TTL bounds staleness for writes made elsewhere.
+INTERACTION_CACHE_USERS = int(os.getenv("INTERACTION_CACHE_USERS", "10000"))
+INTERACTION_CACHE_SECONDS = float(os.getenv("INTERACTION_CACHE_SECONDS", "60"))
+
+# Comment threads behind `/get_comments`: how many posts each worker keeps, and for how long
+COMMENT_CACHE_POSTS = int(os.getenv("COMMENT_CACHE_POSTS", "1000"))
+COMMENT_CACHE_SECONDS = float(os.getenv("COMMENT_CACHE_SECONDS", "60"))
+
+# Post bodies the AI tutor is asked about (`post_id` on `/chat_ws`): how many posts each worker keeps, and for how long.
+# Bodies never change once posted, so the TTL only bounds memory held for posts nobody chats about anymore.
+POST_CONTENT_CACHE_POSTS = int(os.getenv("POST_CONTENT_CACHE_POSTS", "200"))
+POST_CONTENT_CACHE_SECONDS = float(os.getenv("POST_CONTENT_CACHE_SECONDS", "600"))
+
+# BM25 indexes of long notes the AI tutor answers from (see `app.retrieval`), by note content fingerprint
+NOTE_INDEX_CACHE_NOTES = int(os.getenv("NOTE_INDEX_CACHE_NOTES", "200"))
+NOTE_INDEX_CACHE_SECONDS = float(os.getenv("NOTE_INDEX_CACHE_SECONDS", "600"))
+
+
+def hit_ratio(hits: int, misses: int) -> float | None:
+    return round(hits / (hits + misses), 4) if hits + misses else None
+
+
+def fingerprint(*parts) -> str:
+    """Short hex digest of `parts` (bytes, or anything with a `str`), e.g. for ETags."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CachedCourse(NamedTuple):
+    id: int
+    name: str
+    description: str | None
+
+
+class CachedTopic(NamedTuple):
+    id: int
+    name: str
+    courses: tuple[CachedCourse, ...]
+
+
+class Catalog(NamedTuple):
+    topics: tuple[CachedTopic, ...]
+    digest: str  # Changes whenever anything in `topics` does
+
+    @classmethod
+    def build(cls, topics) -> "Catalog":
+        topics = tuple(topics)
+        return cls(topics, fingerprint(encode(topics)))
+
+
+class CachedComment(NamedTuple):
+    id: int
+    post_id: str
+    user_id: str
+    user_name: str
+    content: str
+    created_at: datetime
+
+
+class CatalogCache:
+    """
+    The topic/course tree (a `Catalog`), cached in-process as nested tuples (immutable, so requests can share it).
+    - `get(load)` returns the cached tree, calling `load()` when it is missing or older than `ttl`.
+    - `invalidate()` drops it; a load that started before the invalidation is returned but not stored.
+    """
+
+    def __init__(self, ttl: float = CATALOG_CACHE_SECONDS):
+        self.ttl = ttl
+        self._tree = None
+        self._expires_at = 0.0
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, load) -> Catalog:
+        if self._tree is not None and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return self._tree
+
+        self.misses += 1
+        version = self._version
+        tree = await load()
+        if version == self._version:
+            self._tree, self._expires_at = tree, time.monotonic() + self.ttl
+        return tree
+
+    def invalidate(self):
+        self._version += 1
+        self._tree = None
+
+    def snapshot(self) -> dict:
+        return {"entries": int(self._tree is not None), "hits": self.hits, "misses": self.misses, "hit_ratio": hit_ratio(self.hits, self.misses)}
+
+
+def sorted_contains(values, value) -> bool:
+    """Membership test on a sorted sequence (binary search)."""
+    index = bisect_left(values, value)
+    return index < len(values) and values[index] == value
+
+
+class UserInteractions(NamedTuple):
+    """What one user has liked and favorited, as sorted immutable sequences (a tuple of post IDs, an int64 array of course IDs)."""
+    liked_post_ids: tuple[str, ...]
+    favorite_course_ids: array
+    digest: str  # Changes whenever either set does
+
+    @classmethod
+    def build(cls, liked_post_ids, favorite_course_ids) -> "UserInteractions":
+        liked_post_ids, favorite_course_ids = tuple(sorted(set(liked_post_ids))), array("q", sorted(set(favorite_course_ids)))
+        return cls(liked_post_ids, favorite_course_ids, fingerprint(*liked_post_ids, "|", *favorite_course_ids))
+
+    def likes(self, post_id: str) -> bool:
+        return sorted_contains(self.liked_post_ids, post_id)
+
+    def favorites(self, course_id: int) -> bool:
+        return sorted_contains(self.favorite_course_ids, course_id)
+
+
+class LRUCache:
+    """
+    Bounded LRU of immutable values, each valid for `ttl` seconds.
+    - `get(key, load)` returns the cached value, calling `load()` on a miss. `None` (nothing found) is returned but not stored.
+    - `invalidate(key)` drops one entry (or all of them). A load that overlapped any write or invalidation
+      is returned but not stored, so a slow read cannot put back what a write just replaced.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, load):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        writes = self._writes
+        value = await load()
+        if writes == self._writes and value is not None:
+            self._store(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drops one entry, or every entry."""
+        self._writes += 1
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def snapshot(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "hit_ratio": hit_ratio(self.hits, self.misses)}
+
+    def _store(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class InteractionCache(LRUCache):
+    """
+    `UserInteractions` per user ID.
+    - `update(user_id, ...)` applies a committed write to the cached entry (if any), so this worker never serves
+      its own stale writes.
+    """
+
+    def __init__(self, max_users: int = INTERACTION_CACHE_USERS, ttl: float = INTERACTION_CACHE_SECONDS):
+        super().__init__(max_users, ttl)
+
+    def update(self, user_id: str, liked=(), unliked=(), favorited=(), unfavorited=()):
+        self._writes += 1
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+
+        expires_at, interactions = entry
+        self._entries[user_id] = (expires_at, UserInteractions.build(
+            set(interactions.liked_post_ids).union(liked).difference(unliked),
+            set(interactions.favorite_course_ids).union(favorited).difference(unfavorited),
+        ))
+
+
+# JSON encodings of the cached values, for the shared (L2) tier in `app.shared_cache`
+
+def encode(value) -> bytes:
+    return json.dumps(value, default=lambda item: item.isoformat() if isinstance(item, datetime) else list(item)).encode()
+
+
+def decode_catalog(data: bytes) -> Catalog:
+    topics, _ = json.loads(data)
+    return Catalog.build(
+        CachedTopic(topic_id, name, tuple(CachedCourse(*course) for course in courses))
+        for topic_id, name, courses in topics
+    )
+
+
+def decode_interactions(data: bytes) -> UserInteractions:
+    liked_post_ids, favorite_course_ids, _ = json.loads(data)
+    return UserInteractions.build(liked_post_ids, favorite_course_ids)
+
+
+def decode_comments(data: bytes) -> tuple[CachedComment, ...]:
+    return tuple(
+        CachedComment(*fields, datetime.fromisoformat(created_at))
+        for *fields, created_at in json.loads(data)
+    )
+
+
+# Shared by the `/topics_with_courses` handler and the endpoints that change the catalog
+catalog_cache = CatalogCache()
+
+# Shared by the post and catalog readers and the like/favorite endpoints
+interaction_cache = InteractionCache()
+
+# Post ID -> tuple of `CachedComment`, oldest first; shared by `/get_comments` and the comment endpoints
+comment_cache = LRUCache(COMMENT_CACHE_POSTS, COMMENT_CACHE_SECONDS)
+
+# Post ID -> markdown body; read by `/chat_ws` for conversations about a saved post
+post_content_cache = LRUCache(POST_CONTENT_CACHE_POSTS, POST_CONTENT_CACHE_SECONDS)
+
+# Note content fingerprint -> `app.retrieval.NoteIndex`; read by `/chat_ws` to pick the parts of long notes to send
+note_index_cache = LRUCache(NOTE_INDEX_CACHE_NOTES, NOTE_INDEX_CACHE_SECONDS)
@@ -0,0 +1,124 @@
+"""
+Bounded concurrency with backpressure for slow upstream calls (the AI tutor's LLM requests).
+
+    LLM_MAX_CONCURRENCY=8   # generations in flight per worker
+    LLM_MAX_QUEUE=32        # further requests waiting for a slot; beyond that they are turned away
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app.metrics import LatencyRecorder
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+
+
+class GateFull(Exception):
+    """Every slot is taken and the queue is full."""
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "granted")
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ConcurrencyGate:
+    """
+    At most `limit` holders at once, and at most `max_waiting` callers queued behind them (first come, first served).
+    - `slot(on_queued)` is an async context manager; a caller that has to wait is told its place in line
+      (`await on_queued(position)`, 1 = next), and one that finds the queue full gets `GateFull` right away.
+    - A released slot passes straight to the next waiter, so late arrivals cannot jump the queue.
+    - Works across event loops (the test client runs each connection on its own): the bookkeeping is under a
+      thread lock, and a waiter is woken on the loop it is waiting on.
+    """
+
+    def __init__(self, limit: int = LLM_MAX_CONCURRENCY, max_waiting: int = LLM_MAX_QUEUE):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()  # First in line first
+        self.admitted = 0
+        self.rejected = 0
+        self.peak_waiting = 0
+        self.queue_wait = LatencyRecorder()
+
+    @asynccontextmanager
+    async def slot(self, on_queued=None):
+        start = time.perf_counter()
+        waiter, position = self._enter()
+        if waiter is not None:
+            try:
+                if on_queued is not None:
+                    await on_queued(position)
+                await waiter.future
+            except BaseException:  # Cancelled, or the client went away while being told its position
+                self._abandon(waiter)
+                raise
+        self.queue_wait.record(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._leave()
+
+    def _enter(self) -> tuple:
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                self.admitted += 1
+                return None, 0
+            if len(self._waiters) >= self.max_waiting:
+                self.rejected += 1
+                raise GateFull(f"{self._active} running, {len(self._waiters)} waiting")
+            waiter = _Waiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+            self.peak_waiting = max(self.peak_waiting, len(self._waiters))
+            return waiter, len(self._waiters)
+
+    def _leave(self):
+        with self._lock:
+            if not self._waiters:
+                self._active -= 1
+                return
+            waiter = self._waiters.popleft()
+            waiter.granted = True  # The slot is handed over; `_active` stays the same
+            self.admitted += 1
+        waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    def _abandon(self, waiter: _Waiter):
+        with self._lock:
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                return
+        self._leave()  # It was handed the slot just as it gave up: pass it on
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            active, waiting = self._active, len(self._waiters)
+        return {
+            "limit": self.limit,
+            "max_waiting": self.max_waiting,
+            "active": active,
+            "waiting": waiting,
+            "peak_waiting": self.peak_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.snapshot(),
+        }
+
+
+# Shared by every `/chat_ws` connection of this worker
+llm_gate = ConcurrencyGate()
@@ -0,0 +1,86 @@
+"""
+Consistency checks for denormalized columns.
+
+`Post.like_count` is maintained by `/like_post` and `/remove_like` in the same transaction as
+the `post_likes` row, so it should never drift; this command finds and repairs it if it does
+(manual SQL, restored backups, bugs).
+
+A repair bumps the shared "posts" version, so listing ETags (`posts_etag`) carrying the old counts
+stop matching on every worker (within `VERSION_CACHE_SECONDS` with Redis).
+
+Usage:
+    python -m app.consistency            # report drift, exit code 1 if any
+    python -m app.consistency --repair   # recompute drifted counters
+"""
+import argparse
+import asyncio
+import sys
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Post, PostLike
+from app.shared_cache import shared_cache
+
+
+def find_like_count_drift(db: Session) -> list:
+    """Returns `(post_id, stored_like_count, actual_like_count)` for every post whose counter is wrong."""
+    actual_counts = (
+        select(PostLike.post_id, func.count().label("like_count"))
+        .group_by(PostLike.post_id)
+        .subquery()
+    )
+    actual = func.coalesce(actual_counts.c.like_count, 0)
+
+    return db.execute(
+        select(Post.id, Post.like_count, actual)
+        .outerjoin(actual_counts, actual_counts.c.post_id == Post.id)
+        .where(Post.like_count != actual)
+        .order_by(Post.id)
+    ).all()
+
+
+def repair_like_count_drift(db: Session, post_ids: list) -> int:
+    """
+    Recomputes `like_count` for the given posts and returns how many rows were updated.
+    The count is taken inside the UPDATE, so likes arriving in the meantime are not lost.
+    """
+    if not post_ids:
+        return 0
+
+    actual = select(func.count()).where(PostLike.post_id == Post.id).scalar_subquery()
+    result = db.execute(
+        update(Post).where(Post.id.in_(post_ids)).values(like_count=actual).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repair", action="store_true", help="Recompute the drifted counters")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        drift = find_like_count_drift(db)
+        for post_id, stored, actual in drift:
+            print(f"post {post_id}: like_count={stored}, actual={actual}")
+
+        if not drift:
+            print("like_count is consistent")
+            return 0
+
+        if args.repair:
+            repaired = repair_like_count_drift(db, [post_id for post_id, _, _ in drift])
+            asyncio.run(shared_cache.bump("posts"))
+            print(f"Repaired {repaired} post(s)")
+            return 0
+
+        print(f"{len(drift)} post(s) drifted; re-run with --repair to fix")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import gzip
+
+# Post bodies are compressed once, when they are written, and served as is to clients that accept gzip.
+# Writes are rare next to reads, so the slowest (smallest) level is worth it.
+GZIP_LEVEL = 9
+
+
+def compress_content(content_md: str) -> bytes:
+    """Gzip copy of a post body (`mtime=0`, so the same text always gives the same bytes)."""
+    return gzip.compress(content_md.encode(), compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """Whether an `Accept-Encoding` header allows gzip (explicitly or via `*`, with a non-zero q-value)."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted.get("gzip", accepted.get("*", 0.0)) > 0
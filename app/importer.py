@@ -0,0 +1,183 @@
+"""
+Bulk import of course notes from a directory tree.
+
+    <root>/<topic>/<course>/<post>.md
+
+Directory names become topic and course names; each markdown file becomes a post whose
+title is its first `# heading` (or the file name) and whose preview is its first paragraph.
+Topics and courses are matched by name, so existing ones are reused. Each post gets an ID
+derived from its path, so re-running the import skips what is already there. Posts are
+committed in batches; an interrupted run can simply be started again.
+
+Usage:
+    python -m app.importer notes/ --author-id <user id>
+    python -m app.importer notes/ --author-id <user id> --batch-size 5000
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from app.content import compress_content
+from app.database import SessionLocal, insert_ignore
+from app.models import Course, Post, PostContent, Topic, User
+from app.shared_cache import shared_cache
+
+# Namespace for post IDs: the same relative path always maps to the same post
+POST_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "knowledge-vault:import")
+
+# Limits of `PostCreate`, which the API enforces for posts created one by one
+MAX_TITLE_LENGTH = 100
+MAX_PREVIEW_LENGTH = 500
+MIN_CONTENT_LENGTH = 10
+MAX_CONTENT_LENGTH = 25000
+
+
+def post_id_for(relative_path: str) -> str:
+    return str(uuid.uuid5(POST_ID_NAMESPACE, relative_path))
+
+
+def parse_markdown(text: str, fallback_title: str) -> tuple[str, str]:
+    """Returns `(title, preview_md)`: the first `# heading` (or `fallback_title`) and the first paragraph after it."""
+    title, paragraph = None, []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if title is None and stripped.startswith("# "):
+            title = stripped[2:].strip()
+        elif stripped and not stripped.startswith("#"):
+            paragraph.append(stripped)
+        elif paragraph:
+            break
+
+    preview = " ".join(paragraph) or text.strip()
+    return (title or fallback_title)[:MAX_TITLE_LENGTH], preview[:MAX_PREVIEW_LENGTH]
+
+
+def scan(root: Path) -> dict:
+    """Maps `(topic name, course name)` to the sorted markdown files of that course."""
+    tree = {}
+    for topic_dir in sorted(path for path in root.iterdir() if path.is_dir()):
+        for course_dir in sorted(path for path in topic_dir.iterdir() if path.is_dir()):
+            tree[(topic_dir.name, course_dir.name)] = sorted(course_dir.glob("*.md"))
+    return tree
+
+
+def resolve_catalog(db: Session, names: list[tuple[str, str]]) -> tuple[dict, int]:
+    """
+    Maps `(topic name, course name)` to a course ID, creating missing topics and courses; also returns how many were created.
+    Existing rows are read once and matched in memory; the missing ones are inserted in one statement per table.
+    """
+    topic_ids = {name: topic_id for topic_id, name in db.execute(select(Topic.id, Topic.name)).all()}
+    missing_topics = sorted({topic for topic, _ in names} - topic_ids.keys())
+    if missing_topics:
+        created = db.execute(insert(Topic).returning(Topic.id, Topic.name), [{"name": name} for name in missing_topics]).all()
+        topic_ids.update({name: topic_id for topic_id, name in created})
+
+    course_ids = {(topic_id, name): course_id for course_id, topic_id, name in db.execute(select(Course.id, Course.topic_id, Course.name)).all()}
+    missing_courses = sorted({(topic_ids[topic], course) for topic, course in names} - course_ids.keys())
+    if missing_courses:
+        created = db.execute(
+            insert(Course).returning(Course.id, Course.topic_id, Course.name),
+            [{"topic_id": topic_id, "name": name} for topic_id, name in missing_courses],
+        ).all()
+        course_ids.update({(topic_id, name): course_id for course_id, topic_id, name in created})
+
+    db.commit()
+    return {(topic, course): course_ids[(topic_ids[topic], course)] for topic, course in names}, len(missing_topics) + len(missing_courses)
+
+
+def post_rows(root: Path, tree: dict, course_ids: dict, author_id: str):
+    """
+    Yields `(post row, post_contents row)` per valid markdown file; files outside the API's length limits are
+    reported and skipped.
+    """
+    for (topic, course), files in tree.items():
+        for path in files:
+            content = path.read_text(encoding="utf-8")
+            relative_path = path.relative_to(root).as_posix()
+            if not MIN_CONTENT_LENGTH <= len(content) <= MAX_CONTENT_LENGTH:
+                print(f"skipping {relative_path}: content must be {MIN_CONTENT_LENGTH}-{MAX_CONTENT_LENGTH} characters", file=sys.stderr)
+                continue
+
+            title, preview_md = parse_markdown(content, path.stem)
+            modified = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).replace(tzinfo=None) + timedelta(hours=2)
+            post_id = post_id_for(relative_path)
+            yield {
+                "id": post_id,
+                "course_id": course_ids[(topic, course)],
+                "author_id": author_id,
+                "title": title,
+                "preview_md": preview_md,
+                "created_at": modified,  # Same UTC+2 convention as posts created through the API
+            }, {
+                "post_id": post_id,
+                "content_md": content,
+                "content_gzip": compress_content(content),
+            }
+
+
+def import_tree(db: Session, root: Path, author_id: str, batch_size: int = 2000) -> dict:
+    """Imports `root` and returns counts of courses and posts seen, of posts inserted, and of topics and courses created."""
+    if db.get(User, author_id) is None:
+        raise ValueError(f"Author {author_id} not found")
+
+    tree = scan(root)
+    course_ids, catalog_inserted = resolve_catalog(db, list(tree))
+    statement = insert_ignore(db, Post).returning(Post.id)
+    contents_statement = insert_ignore(db, PostContent)
+
+    def insert_batch(batch: list) -> int:
+        inserted = len(db.execute(statement, [post for post, _ in batch]).all())
+        db.execute(contents_statement, [content for _, content in batch])  # Bodies of posts already there are kept
+        db.commit()  # Each batch is durable, so an interrupted run resumes where it stopped
+        return inserted
+
+    seen = inserted = 0
+    batch = []
+    for rows in post_rows(root, tree, course_ids, author_id):
+        batch.append(rows)
+        if len(batch) == batch_size:
+            inserted += insert_batch(batch)
+            seen += len(batch)
+            batch = []
+    if batch:
+        inserted += insert_batch(batch)
+        seen += len(batch)
+
+    return {"courses": len(course_ids), "posts": seen, "inserted": inserted, "catalog_inserted": catalog_inserted}
+
+
+async def announce_import():
+    """Tells running workers (through the shared cache, when it is Redis) that the catalog and listings changed."""
+    await shared_cache.invalidate("catalog")
+    await shared_cache.bump("posts")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", type=Path, help="Directory laid out as <topic>/<course>/<post>.md")
+    parser.add_argument("--author-id", required=True, help="User ID recorded as the author of every imported post")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Posts per INSERT statement and commit")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        counts = import_tree(db, args.root, args.author_id, args.batch_size)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+    if counts["inserted"] or counts["catalog_inserted"]:  # A new course shows up in the catalog even without posts
+        asyncio.run(announce_import())
+
+    print(f"{counts['courses']} course(s), {counts['posts']} post(s): {counts['inserted']} imported, {counts['posts'] - counts['inserted']} already present")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
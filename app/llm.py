@@ -0,0 +1,198 @@
+"""
+Language model behind the AI tutor (`/chat_ws`).
+
+Every backend has the same two methods:
+- `complete(prompt)`: the whole answer, as text.
+- `stream(prompt)`: the answer as it is generated, an async iterator of text pieces.
+
+    LLM_BACKEND=gemini     # default; needs GEMINI_API_KEY (checked on the first prompt, not at startup)
+    LLM_BACKEND=fake       # local and deterministic, for offline development and load tests:
+                           # LLM_FAKE_FIRST_TOKEN_MS=300, LLM_FAKE_TOKENS_PER_SECOND=50,
+                           # LLM_FAKE_TOKENS=200 per answer, LLM_FAKE_CHUNK_TOKENS=8 per streamed piece,
+                           # LLM_FAKE_PROMPT_TOKENS_PER_SECOND=0 (reading the prompt takes no time unless set)
+    LLM_BACKEND=cassette   # replays answers recorded in LLM_CASSETTE=llm_cassette.jsonl, with their timing
+                           # (LLM_CASSETTE_REALTIME=0 replays them without waiting);
+                           # LLM_CASSETTE_RECORD=gemini (or fake) answers and records prompts the cassette lacks
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from app.cache import fingerprint
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+LLM_FAKE_FIRST_TOKEN_MS = float(os.getenv("LLM_FAKE_FIRST_TOKEN_MS", "300"))
+LLM_FAKE_TOKENS_PER_SECOND = float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", "50"))
+LLM_FAKE_TOKENS = int(os.getenv("LLM_FAKE_TOKENS", "200"))
+LLM_FAKE_CHUNK_TOKENS = int(os.getenv("LLM_FAKE_CHUNK_TOKENS", "8"))
+LLM_FAKE_PROMPT_TOKENS_PER_SECOND = float(os.getenv("LLM_FAKE_PROMPT_TOKENS_PER_SECOND", "0"))
+
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", "llm_cassette.jsonl")
+LLM_CASSETTE_RECORD = os.getenv("LLM_CASSETTE_RECORD", "")
+LLM_CASSETTE_REALTIME = os.getenv("LLM_CASSETTE_REALTIME", "1") == "1"
+
+# Rough size of a token in characters, for budgets and the fake's timing; no tokenizer of the model is needed for that
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class GeminiBackend:
+    """Google's Gemini through its async client; the API key is read and the client configured on the first prompt."""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        self.model_name = model_name
+        self._model = None
+
+    async def complete(self, prompt: str) -> str:
+        return (await self.model().generate_content_async(prompt)).text
+
+    async def stream(self, prompt: str):
+        async for chunk in await self.model().generate_content_async(prompt, stream=True):
+            yield chunk.text
+
+    def model(self):
+        if self._model is None:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise RuntimeError("GEMINI_API_KEY is missing! Please check your .env file (or set LLM_BACKEND=fake).")
+
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+
+class FakeBackend:
+    """
+    Answers without a network, at a set speed: nothing for `first_token_ms` (plus the prompt's length at
+    `prompt_tokens_per_second`, when given), then `tokens_per_second`, streamed `chunk_tokens` at a time.
+    The answer is `answer` when given, otherwise `tokens` words picked from the prompt, the same ones for the same prompt.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        answer: str = None,
+        tokens: int = LLM_FAKE_TOKENS,
+        first_token_ms: float = LLM_FAKE_FIRST_TOKEN_MS,
+        tokens_per_second: float = LLM_FAKE_TOKENS_PER_SECOND,
+        chunk_tokens: int = LLM_FAKE_CHUNK_TOKENS,
+        prompt_tokens_per_second: float = LLM_FAKE_PROMPT_TOKENS_PER_SECOND,
+    ):
+        self.answer = answer
+        self.tokens = tokens
+        self.first_token_seconds = first_token_ms / 1000
+        self.seconds_per_token = 1 / tokens_per_second if tokens_per_second else 0.0
+        self.chunk_tokens = chunk_tokens
+        self.seconds_per_prompt_token = 1 / prompt_tokens_per_second if prompt_tokens_per_second else 0.0
+
+    async def complete(self, prompt: str) -> str:
+        return "".join([text async for text in self.stream(prompt)])
+
+    async def stream(self, prompt: str):
+        tokens = self.answer_tokens(prompt)
+        await asyncio.sleep(self.first_token_seconds + estimate_tokens(prompt) * self.seconds_per_prompt_token)
+        for start in range(0, len(tokens), self.chunk_tokens):
+            chunk = tokens[start:start + self.chunk_tokens]
+            await asyncio.sleep(len(chunk) * self.seconds_per_token)
+            yield "".join(chunk)
+
+    def answer_tokens(self, prompt: str) -> list[str]:
+        """The answer split after each run of whitespace, so the pieces join back into it exactly."""
+        if self.answer is not None:
+            return re.findall(r"\s*\S+\s*", self.answer) or [self.answer]
+        words = re.findall(r"\w+", prompt) or ["answer"]
+        rng = random.Random(fingerprint(prompt))
+        return [f"{rng.choice(words)} " for _ in range(self.tokens - 1)] + [f"{rng.choice(words)}."]
+
+
+class CassetteBackend:
+    """
+    Replays answers recorded earlier, one JSON line per prompt in `path`:
+        {"prompt": <fingerprint of the prompt>, "chunks": [[<ms since the previous chunk>, <text>], ...]}
+    - With `realtime`, each chunk waits as long as it took when it was recorded.
+    - With a `recorder` backend, prompts missing from the cassette are answered by it and appended to the file,
+      so recording can be stopped and resumed; without one, a missing prompt raises `LookupError`.
+    """
+
+    name = "cassette"
+
+    def __init__(self, path, recorder=None, realtime: bool = LLM_CASSETTE_REALTIME):
+        self.path = Path(path)
+        self.recorder = recorder
+        self.realtime = realtime
+        self._chunks = {}  # prompt fingerprint -> [(seconds, text), ...]
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._chunks[entry["prompt"]] = [(ms / 1000, text) for ms, text in entry["chunks"]]
+
+    async def complete(self, prompt: str) -> str:
+        return "".join([text async for text in self.stream(prompt)])
+
+    async def stream(self, prompt: str):
+        key = fingerprint(prompt)
+        chunks = self._chunks.get(key)
+        if chunks is None:
+            if self.recorder is None:
+                raise LookupError(f"No recorded answer for prompt {key} in {self.path}")
+            async for text in self._record(key, prompt):
+                yield text
+            return
+
+        for seconds, text in chunks:
+            if self.realtime:
+                await asyncio.sleep(seconds)
+            yield text
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    async def _record(self, key: str, prompt: str):
+        chunks, last = [], time.perf_counter()
+        async for text in self.recorder.stream(prompt):
+            now = time.perf_counter()
+            chunks.append((now - last, text))
+            last = now
+            yield text
+
+        # Only complete answers are kept; one cut short (e.g. the client went away) is asked again next time
+        self._chunks[key] = chunks
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as file:
+            file.write(json.dumps({"prompt": key, "chunks": [[round(seconds * 1000, 1), text] for seconds, text in chunks]}) + "\n")
+
+
+def backend_from_env(name: str = LLM_BACKEND):
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "fake":
+        return FakeBackend()
+    if name == "cassette":
+        if LLM_CASSETTE_RECORD == "cassette":
+            raise RuntimeError("LLM_CASSETTE_RECORD must name the backend that answers new prompts ('gemini' or 'fake')")
+        return CassetteBackend(LLM_CASSETTE, recorder=backend_from_env(LLM_CASSETTE_RECORD) if LLM_CASSETTE_RECORD else None)
+    raise RuntimeError(f"Unknown LLM_BACKEND {name!r} (expected 'gemini', 'fake' or 'cassette')")
+
+
+llm = backend_from_env()
@@ -1,20 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException, Header, Query, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func, exists
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic_core import to_json
+from sqlalchemy.orm import joinedload
+from sqlalchemy import delete, exists, insert, select, tuple_, update
 from datetime import datetime, timezone, timedelta
-from app.database import SessionLocal
+from typing import Literal
+from app.database import AsyncSessionLocal, insert_ignore, pool_stats, recent_writers
+from app.cache import (
+    Catalog, CachedComment, CachedCourse, CachedTopic, UserInteractions, catalog_cache, comment_cache, interaction_cache,
+    note_index_cache, post_content_cache,
+    decode_catalog, decode_comments, decode_interactions, encode, fingerprint,
+)
+from app.shared_cache import shared_cache
+from app.content import accepts_gzip, compress_content
+from app.concurrency import GateFull, llm_gate
+from app.llm import llm
+from app.retrieval import note_context
+from app.metrics import LoopLagMonitor
+from app.pagination import decode_cursor, encode_cursor
 from app.models import *
 from app.schemas import *
-from app.gemini import *
 import json
 import asyncio
 import re
 import os
 
+# Another worker's write drops our local (L1) copy of what it changed
+shared_cache.on_invalidate("catalog", lambda key: catalog_cache.invalidate())
+shared_cache.on_invalidate("interactions:", lambda key: interaction_cache.invalidate(key.removeprefix("interactions:")))
+shared_cache.on_invalidate("comments:", lambda key: comment_cache.invalidate(key.removeprefix("comments:")))
+
+
+# Exported by `/internal/llm_stats`
+loop_lag = LoopLagMonitor()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = asyncio.create_task(shared_cache.listen())  # Cross-worker invalidation messages
+    lag_monitor = asyncio.create_task(loop_lag.run())
+    yield
+    listener.cancel()
+    lag_monitor.cancel()
+
+
 # FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",  # React Frontend (Change in production)
@@ -41,20 +75,48 @@ async def block_bad_ips(request, call_next):
 
 CSRF_TOKEN = "lofasz"
 
-# Dependency for database session
-def get_db():
-    db = SessionLocal()
-    try:
+# Rows fetched per round trip when a listing is streamed with `format=ndjson`
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "100"))
+
+# Hosts allowed to call the `/internal/*` stats endpoints (loopback only by default)
+INTERNAL_ALLOWED_HOSTS = set(os.getenv("INTERNAL_ALLOWED_HOSTS", "127.0.0.1,::1").split(","))
+
+# Dependency for database session (primary)
+# Read-your-writes: on commit the writer is remembered and gets a `last_write_at` cookie,
+# which keeps their reads on the primary for a few seconds (see `RecentWriters`)
+async def get_db(request: Request, response: Response):
+    async with AsyncSessionLocal(info={"writer": request.headers.get("user-id"), "response": response}) as db:
+        yield db
+
+
+def may_read_replica(connection: Request | WebSocket) -> bool:
+    """Whether this client's reads may go to a replica: not if they just wrote something."""
+    return not (
+        recent_writers.is_recent(connection.headers.get("user-id"))
+        or recent_writers.cookie_is_recent(connection.cookies.get(recent_writers.cookie_name))
+    )
+
+
+# Dependency for read-only handlers (replica, unless the user just wrote something)
+async def get_read_db(request: Request):
+    async with AsyncSessionLocal(info={"read_only": may_read_replica(request)}) as db:
         yield db
-    finally:
-        db.close()
 
 
 def verify_csrf(csrf_token: str = Header(None)):
     if csrf_token != CSRF_TOKEN:
         raise HTTPException(status_code=403, detail="Invalid CSRF Token")
 
-def validate_id(db: Session, model, field: str, value, error_message: str):
+def verify_internal(request: Request):
+    """The CSRF token ships with the frontend, so internal endpoints are also limited by client address."""
+    if request.client is None or request.client.host not in INTERNAL_ALLOWED_HOSTS:
+        raise HTTPException(status_code=403, detail="Internal endpoint")
+
+def utc_now_local():
+    """Naive timestamp (UTC+2) stored in the `DateTime` columns; asyncpg rejects tz-aware values there."""
+    return datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=2)
+
+async def validate_id(db: AsyncSession, model, field: str, value, error_message: str):
     """
     Generic validation function to check if a given ID exists in the database.
     - `model`: SQLAlchemy model (e.g., Post, User, Course, Topic).
@@ -62,108 +124,245 @@ def validate_id(db: Session, model, field: str, value, error_message: str):
     - `value`: The value being validated.
     - `error_message`: The error message to return if not found.
     """
-    exists = db.query(model).filter(getattr(model, field) == value).first()
+    exists = (await db.execute(select(model).filter(getattr(model, field) == value).limit(1))).scalars().first()
     if not exists:
         raise HTTPException(status_code=404, detail=error_message)
     return exists
 
+async def validate_ids(db: AsyncSession, *checks):
+    """
+    Check several referenced IDs in a single round trip (one `SELECT EXISTS(..), EXISTS(..)`).
+    - `checks`: `(model, field, value, error_message)` tuples, like the `validate_id` arguments,
+      in the order their errors take precedence.
+    - Raises 404 with the message of the first check that fails.
+    """
+    found = (await db.execute(select(*(
+        exists().where(getattr(model, field) == value) for model, field, value, _ in checks
+    )))).one()
+    for (_, _, _, error_message), present in zip(checks, found):
+        if not present:
+            raise HTTPException(status_code=404, detail=error_message)
+
+async def existing_ids(db: AsyncSession, user_id: str, model, ids: list) -> set:
+    """
+    Validates the user and finds which of `ids` exist in `model`, in a single query.
+    - Raises 404 "User not found" if the user does not exist.
+    """
+    rows = (await db.execute(
+        select(User.id, model.id).select_from(User).outerjoin(model, model.id.in_(ids)).filter(User.id == user_id)
+    )).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {found_id for _, found_id in rows if found_id is not None}
+
+async def user_interactions(db: AsyncSession, user_id: str) -> UserInteractions:
+    """The posts `user_id` has liked and the courses they have favorited, from `interaction_cache` when possible."""
+    async def load():
+        liked = (await db.execute(select(PostLike.post_id).filter(PostLike.user_id == user_id))).scalars().all()
+        favorited = (await db.execute(select(FavoriteCourse.course_id).filter(FavoriteCourse.user_id == user_id))).scalars().all()
+        return UserInteractions.build(liked, favorited)
+
+    return await interaction_cache.get(user_id, lambda: shared_cache.fetch(
+        f"interactions:{user_id}", load, encode, decode_interactions, interaction_cache.ttl
+    ))
+
+
+async def user_interactions_changed(user_id: str, **changes):
+    """After a committed like/favorite write: update our cached copy, drop the shared one and notify the other workers."""
+    interaction_cache.update(user_id, **changes)
+    await shared_cache.invalidate(f"interactions:{user_id}")
+    if changes.get("liked") or changes.get("unliked"):
+        await shared_cache.bump("posts")  # Like counts (and so listings) changed
+
+
+def json_rows(rows: list[dict], response: Response) -> Response:
+    """
+    Fast path for long lists: encodes plain dicts straight to JSON with pydantic-core's encoder
+    (the same bytes FastAPI would send), skipping per-row models and `response_model` validation.
+    - The rows must already have the response model's fields; the model still documents the endpoint.
+    - Keys left out are omitted, like `response_model_exclude_unset` does.
+    - Headers set on `response` (ETag and friends) are carried over.
+    """
+    return Response(content=to_json(rows), media_type="application/json", headers=dict(response.headers))
+
+
+def ndjson_rows(db: AsyncSession, query, to_fields, response: Response) -> StreamingResponse:
+    """
+    Streaming counterpart of `json_rows` for listings without a limit: one JSON object per line, written as the
+    rows arrive from a server-side cursor, `STREAM_BATCH_ROWS` at a time, so memory stays flat however many match.
+    - `to_fields(row)` turns one result row into its dict.
+    - `db` is read while the body is sent; request-scoped dependencies such as `get_read_db` stay open until then.
+    """
+    async def lines():
+        result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_ROWS))
+        async for rows in result.partitions():
+            yield b"".join(to_json(to_fields(row)) + b"\n" for row in rows)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=dict(response.headers))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """`If-None-Match` check (weak comparison, as the header requires)."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+
+def not_modified(request: Request, response: Response, etag: str, *surrogate_keys: str, vary: str = "User-ID") -> Optional[Response]:
+    """
+    Sets the validators and caching headers of a GET response (per user unless `vary` says otherwise).
+    - Returns a bodiless 304 if the client's `If-None-Match` already has `etag`; otherwise the headers go on `response`.
+    - `Cache-Control: no-cache` lets browsers and a reverse proxy store the response but revalidate it every time,
+      `Vary` keeps differing copies apart, and `Surrogate-Key` names what a proxy can purge it by.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": vary, "Surrogate-Key": " ".join(surrogate_keys)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 @app.post("/create_post", response_model=PostAfterCreateResponse, dependencies=[Depends(verify_csrf)])
-def create_post(post_data: PostCreate, db: Session = Depends(get_db)) -> PostAfterCreateResponse:
-    if not db.query(Course).filter(Course.id == post_data.course_id).first():
-        raise HTTPException(status_code=404, detail="Course not found")
+async def create_post(post_data: PostCreate, db: AsyncSession = Depends(get_db)) -> PostAfterCreateResponse:
+    await validate_ids(
+        db,
+        (Course, "id", post_data.course_id, "Course not found"),
+        (User, "id", post_data.author_id, "Author not found"),
+    )
 
-    validate_id(db, User, "id", post_data.author_id, "Author not found")
-    validate_id(db, Course, "id", post_data.course_id, "Course not found")
-    
-    new_post = Post(
+    # RETURNING hands back the generated columns, so no `refresh` round trip is needed
+    new_post = (await db.execute(insert(Post).values(
         course_id=post_data.course_id,
         author_id=post_data.author_id,
         title=post_data.title, 
         preview_md=post_data.preview_md,
+        created_at=utc_now_local()
+    ).returning(Post))).scalar_one()
+
+    # The body goes to its own table, in the same transaction
+    await db.execute(insert(PostContent).values(
+        post_id=new_post.id,
+        content_md=post_data.content_md,
+        content_gzip=compress_content(post_data.content_md),  # Compressed once here, served as is by `/get_post/{id}/content`
+    ))
+
+    db.info["writer"] = post_data.author_id  # No User-ID header on this endpoint
+    await db.commit()
+    await shared_cache.bump("posts")  # Listings are not cached, but their version tells every worker they changed
+
+    return PostAfterCreateResponse(
+        id=new_post.id,
+        course_id=new_post.course_id,
+        author_id=new_post.author_id,
+        title=new_post.title,
+        preview_md=new_post.preview_md,
         content_md=post_data.content_md,
-        created_at=datetime.now(timezone.utc) + timedelta(hours=2) 
+        created_at=new_post.created_at,
     )
 
-    db.add(new_post)
-    db.commit()
-    db.refresh(new_post) 
-
-    return new_post
-
 
 @app.post("/create_user", response_model=UserResponse, dependencies=[Depends(verify_csrf)])
-def create_user(user_data: UserCreate, db: Session = Depends(get_db)) -> UserResponse:
+async def create_user(user_data: UserCreate, db: AsyncSession = Depends(get_db)) -> UserResponse:
     # Check if email or username already exists
-    existing_user: User | None = db.query(User).filter(
+    existing_user: User | None = (await db.execute(select(User).filter(
         (User.email == user_data.email) | (User.userName == user_data.userName)
-    ).first()
+    ))).scalars().first()
 
     if existing_user:
         raise HTTPException(status_code=400, detail="Email or Username already exists")
 
-    new_user: User = User(
+    new_user: User = (await db.execute(insert(User).values(
         id=user_data.id,
         email=user_data.email,
         userName=user_data.userName,
         name=user_data.name,
         imageUrl=user_data.imageUrl,
         is_admin=user_data.is_admin
-    )
+    ).returning(User))).scalar_one()
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user) 
+    await db.commit()
 
     return new_user
 
 
 @app.post("/create_course", response_model=CourseResponse, dependencies=[Depends(verify_csrf)])
-def create_course(course_data: CourseCreate, db: Session = Depends(get_db)) -> CourseResponse:
+async def create_course(course_data: CourseCreate, db: AsyncSession = Depends(get_db)) -> CourseResponse:
     
-    validate_id(db, Topic, "id", course_data.topic_id, "Topic not found")
+    await validate_ids(db, (Topic, "id", course_data.topic_id, "Topic not found"))
     
-    new_course: Course = Course(
+    new_course: Course = (await db.execute(insert(Course).values(
         name=course_data.name,
         description=course_data.description,
         topic_id=course_data.topic_id
-    )
+    ).returning(Course))).scalar_one()  # RETURNING gives us the generated ID
 
-    db.add(new_course)
-    db.commit()
-    db.refresh(new_course)  # Reload the object to get the generated ID
+    await db.commit()
+    catalog_cache.invalidate()
+    await shared_cache.invalidate("catalog")
 
     return new_course
 
 @app.post("/create_topic", response_model=TopicResponse, dependencies=[Depends(verify_csrf)])
-def create_topic(topic_data: TopicCreate, db: Session = Depends(get_db)) -> TopicResponse:
-    new_topic: Topic = Topic(
+async def create_topic(topic_data: TopicCreate, db: AsyncSession = Depends(get_db)) -> TopicResponse:
+    new_topic: Topic = (await db.execute(insert(Topic).values(
         name=topic_data.name
-    )
+    ).returning(Topic))).scalar_one()  # RETURNING gives us the generated ID
 
-    db.add(new_topic)
-    db.commit()
-    db.refresh(new_topic)  # Reload the object to get the generated ID
+    await db.commit()
+    catalog_cache.invalidate()
+    await shared_cache.invalidate("catalog")
 
     return new_topic
 
+async def load_catalog() -> Catalog:
+    """
+    The whole topic/course tree in one query (topics joined to their courses), as immutable tuples.
+    Reads from the primary: a tree loaded from a lagging replica right after a write would be cached for the full TTL.
+    """
+    async with AsyncSessionLocal() as db:
+        topics = (await db.execute(select(Topic).options(joinedload(Topic.courses)).order_by(Topic.id))).unique().scalars().all()
+        return Catalog.build(
+            CachedTopic(
+                id=topic.id,
+                name=topic.name,
+                courses=tuple(
+                    CachedCourse(id=course.id, name=course.name, description=course.description)
+                    for course in sorted(topic.courses, key=lambda course: course.id)
+                ),
+            )
+            for topic in topics
+        )
+
+
 @app.get("/topics_with_courses", response_model=list[TopicWithCoursesResponse], dependencies=[Depends(verify_csrf)])
-def get_topics_with_courses(user_id: str = Header(..., title="User ID"), db: Session = Depends(get_db)):
+async def get_topics_with_courses(
+    request: Request,
+    response: Response,
+    user_id: str = Header(..., title="User ID"),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Fetch topics along with courses, marking whether a course is favorited by the user.
+    - The tree comes from `catalog_cache` and the user's favorites from `interaction_cache`.
+    - The ETag combines the digests of both, so an unchanged catalog is a 304 without building the response.
     """
 
     # Get the user's favorite courses
-    favorite_course_ids = {
-        fav.course_id for fav in db.query(FavoriteCourse).filter(FavoriteCourse.user_id == user_id).all()
-    }
+    interactions = await user_interactions(db, user_id)
+
+    catalog = await catalog_cache.get(
+        lambda: shared_cache.fetch("catalog", load_catalog, encode, decode_catalog, catalog_cache.ttl)
+    )
 
-    # Fetch all topics with courses
-    topics = db.query(Topic).all()
+    etag = f'"{fingerprint("catalog", catalog.digest, interactions.digest)}"'
+    if cached := not_modified(request, response, etag, "catalog", f"user-{user_id}"):
+        return cached
     
-    # Format response
-    topics_with_courses = []
-    for topic in topics:
-        topic_data = TopicWithCoursesResponse(
+    # Format response, overlaying the user's favorites on the shared tree
+    return [
+        TopicWithCoursesResponse(
             id=topic.id,
             name=topic.name,
             courses=[
@@ -171,126 +370,157 @@ def get_topics_with_courses(user_id: str = Header(..., title="User ID"), db: Ses
                     id=course.id,
                     name=course.name,
                     description=course.description,
-                    is_favorite=course.id in favorite_course_ids  # Mark favorite courses
+                    is_favorite=interactions.favorites(course.id)  # Mark favorite courses
                 )
-                for course in topic.courses  # Fetch courses for each topic
+                for course in topic.courses
             ]
         )
-        topics_with_courses.append(topic_data)
-
-    return topics_with_courses
+        for topic in catalog.topics
+    ]
 
 
 @app.post("/add_favorite_course", dependencies=[Depends(verify_csrf)])
-def add_favorite_course(
+async def add_favorite_course(
     user_id: str = Header(..., title="User ID"), 
     course_id: int = Query(..., title="Course ID"), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Add a course to favorites"""
     
-    validate_id(db, Course, "id", course_id, "Course not found")
-    validate_id(db, User, "id", user_id, "User not found")
-
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
+    await validate_ids(
+        db,
+        (Course, "id", course_id, "Course not found"),
+        (User, "id", user_id, "User not found"),
+    )
 
-    existing_favorite = db.query(FavoriteCourse).filter(
-        FavoriteCourse.user_id == user_id,
-        FavoriteCourse.course_id == course_id
-    ).first()
+    # One statement both checks and inserts; a concurrent duplicate gets no row back instead of a PK violation
+    added = (await db.execute(
+        insert_ignore(db, FavoriteCourse).values(user_id=user_id, course_id=course_id).returning(FavoriteCourse.course_id)
+    )).first()
 
-    if existing_favorite:
+    if added is None:
         raise HTTPException(status_code=400, detail="Course already favorited")
 
-    new_favorite = FavoriteCourse(user_id=user_id, course_id=course_id)
-    db.add(new_favorite)
-    db.commit()
+    await db.commit()
+    await user_interactions_changed(user_id, favorited=[course_id])
 
     return {"message": "Course added to favorites"}
 
 
 @app.delete("/remove_favorite_course", dependencies=[Depends(verify_csrf)])
-def remove_favorite_course(
+async def remove_favorite_course(
     user_id: str = Header(..., title="User ID"), 
     course_id: int = Query(..., title="Course ID"), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Remove a course from favorites"""
 
-    favorite_entry = db.query(FavoriteCourse).filter(
+    favorite_entry = (await db.execute(select(FavoriteCourse).filter(
         FavoriteCourse.user_id == user_id,
         FavoriteCourse.course_id == course_id
-    ).first()
+    ))).scalars().first()
 
     if not favorite_entry:
         raise HTTPException(status_code=404, detail="Favorite course not found")
 
-    db.delete(favorite_entry)
-    db.commit()
+    await db.delete(favorite_entry)
+    await db.commit()
+    await user_interactions_changed(user_id, unfavorited=[course_id])
 
     return {"message": "Course removed from favorites"}
 
 
+@app.post("/favorite_courses/batch", response_model=BatchResponse, dependencies=[Depends(verify_csrf)])
+async def add_favorite_courses(
+    request: CourseIdsRequest,
+    user_id: str = Header(..., title="User ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Add several courses to favorites with one validation query and one multi-row insert.
+    - Per course: "favorited", "already_favorited" or "not_found".
+    """
+
+    course_ids = list(dict.fromkeys(request.course_ids))
+    found = await existing_ids(db, user_id, Course, course_ids)
+
+    added = set()
+    if found:
+        added = set((await db.execute(
+            insert_ignore(db, FavoriteCourse)
+            .values([{"user_id": user_id, "course_id": course_id} for course_id in course_ids if course_id in found])
+            .returning(FavoriteCourse.course_id)
+        )).scalars().all())
+        await db.commit()
+        await user_interactions_changed(user_id, favorited=added)
+
+    return BatchResponse(results=[
+        BatchItemResult(
+            id=course_id,
+            status="not_found" if course_id not in found else "favorited" if course_id in added else "already_favorited",
+        )
+        for course_id in course_ids
+    ])
+
+
 @app.get("/favorite_courses", response_model=list[CourseResponse], dependencies=[Depends(verify_csrf)])
-def get_favorite_courses(user_id: str = Header(..., title="User ID"), db: Session = Depends(get_db)):
+async def get_favorite_courses(response: Response, user_id: str = Header(..., title="User ID"), db: AsyncSession = Depends(get_read_db)):
     """Returns a list of courses that are favorited by the user, marking them explicitly as favorites."""
     
-    validate_id(db, User, "id", user_id, "User not found")
+    await validate_id(db, User, "id", user_id, "User not found")
 
-    favorite_courses = db.query(Course).join(FavoriteCourse, Course.id == FavoriteCourse.course_id).filter(
+    favorite_courses = (await db.execute(select(Course).join(FavoriteCourse, Course.id == FavoriteCourse.course_id).filter(
         FavoriteCourse.user_id == user_id
-    ).all()
+    ))).scalars().all()
 
-    return [
-        CourseResponse(
-            id=course.id,
+    return json_rows([
+        dict(
             name=course.name,
             description=course.description,
             topic_id=course.topic_id,
-            is_favorite=True  
+            id=course.id,
+            is_favorite=True
         )
         for course in favorite_courses
-    ]
+    ], response)
 
 
 @app.post("/like_post", dependencies=[Depends(verify_csrf)])
-def like_post(
+async def like_post(
     post_id: str = Query(..., title="Post ID"),
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     user_id: str = Header(..., title="User ID")
 ):
     """Allows a user to like a post if they haven't already."""
     
-    validate_id(db, Post, "id", post_id, "Post not found")
-    validate_id(db, User, "id", user_id, "User not found")
+    await validate_ids(
+        db,
+        (Post, "id", post_id, "Post not found"),
+        (User, "id", user_id, "User not found"),
+    )
 
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID is required")
 
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    # Check if user has already liked the post
-    existing_like = db.query(PostLike).filter(
-        PostLike.post_id == post_id, PostLike.user_id == user_id
-    ).first()
+    # One statement both checks and inserts; a concurrent double-click gets no row back instead of a PK violation
+    added = (await db.execute(
+        insert_ignore(db, PostLike).values(user_id=user_id, post_id=post_id).returning(PostLike.post_id)
+    )).first()
 
-    if existing_like:
+    if added is None:
         raise HTTPException(status_code=400, detail="User has already liked this post")
 
-    new_like = PostLike(user_id=user_id, post_id=post_id)
-    db.add(new_like)
-    db.commit()
+    # Keep the denormalized counter in the same transaction as the like itself
+    await db.execute(update(Post).where(Post.id == post_id).values(like_count=Post.like_count + 1))
+    await db.commit()
+    await user_interactions_changed(user_id, liked=[post_id])
 
     return {"message": "Post liked successfully"}
 
 @app.delete("/remove_like", dependencies=[Depends(verify_csrf)])
-def remove_like(
+async def remove_like(
     post_id: str = Query(..., title="Post ID"),
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     user_id: str = Header(..., title="User ID")
 ):
     """Allows a user to remove their like from a post."""
@@ -298,51 +528,221 @@ def remove_like(
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID is required")
 
-    like = db.query(PostLike).filter(
-        PostLike.post_id == post_id, PostLike.user_id == user_id
-    ).first()
+    # Delete first and decrement only if this request removed the row, so concurrent removes count once
+    result = await db.execute(delete(PostLike).where(PostLike.post_id == post_id, PostLike.user_id == user_id))
 
-    if not like:
+    if result.rowcount != 1:
         raise HTTPException(status_code=400, detail="User has not liked this post")
 
-    db.delete(like)
-    db.commit()
+    await db.execute(update(Post).where(Post.id == post_id, Post.like_count > 0).values(like_count=Post.like_count - 1))
+    await db.commit()
+    await user_interactions_changed(user_id, unliked=[post_id])
 
     return {"message": "Like removed successfully"}
 
 
-@app.get("/get_post/{post_id}", response_model=PostResponse, dependencies=[Depends(verify_csrf)])
-def get_post(post_id: str, db: Session = Depends(get_db), user_id: str = Header(..., title="User ID")) -> PostResponse:
-    """Fetch a post by ID, count likes, check if the user liked it, and return author name."""
-    
-    post = validate_id(db, Post, "id", post_id, "Post not found")
+@app.post("/like_posts", response_model=BatchResponse, dependencies=[Depends(verify_csrf)])
+async def like_posts(
+    request: PostIdsRequest,
+    user_id: str = Header(..., title="User ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Like several posts with one validation query, one multi-row insert and one counter update.
+    - Per post: "liked", "already_liked" or "not_found".
+    """
 
-    author = db.query(User.name).filter(User.id == post.author_id).scalar()
-    author_name = author if author else "Unknown User"
+    post_ids = list(dict.fromkeys(request.post_ids))
+    found = await existing_ids(db, user_id, Post, post_ids)
+
+    liked = set()
+    if found:
+        liked = set((await db.execute(
+            insert_ignore(db, PostLike)
+            .values([{"user_id": user_id, "post_id": post_id} for post_id in post_ids if post_id in found])
+            .returning(PostLike.post_id)
+        )).scalars().all())
+        if liked:
+            await db.execute(update(Post).where(Post.id.in_(liked)).values(like_count=Post.like_count + 1))
+        await db.commit()
+        await user_interactions_changed(user_id, liked=liked)
+
+    return BatchResponse(results=[
+        BatchItemResult(
+            id=post_id,
+            status="not_found" if post_id not in found else "liked" if post_id in liked else "already_liked",
+        )
+        for post_id in post_ids
+    ])
+
+
+@app.post("/unlike_posts", response_model=BatchResponse, dependencies=[Depends(verify_csrf)])
+async def unlike_posts(
+    request: PostIdsRequest,
+    user_id: str = Header(..., title="User ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Remove several likes with one multi-row delete and one counter update.
+    - Per post: "unliked", or "not_liked" (also for posts that do not exist).
+    """
 
-    like_count = db.query(func.count(PostLike.user_id)).filter(PostLike.post_id == post_id).scalar()
-    liked_by_user = db.query(PostLike).filter(PostLike.post_id == post_id, PostLike.user_id == user_id).first() is not None
+    post_ids = list(dict.fromkeys(request.post_ids))
 
-    return PostResponse(
+    unliked = set((await db.execute(
+        delete(PostLike).where(PostLike.user_id == user_id, PostLike.post_id.in_(post_ids)).returning(PostLike.post_id)
+    )).scalars().all())
+    if unliked:
+        await db.execute(update(Post).where(Post.id.in_(unliked), Post.like_count > 0).values(like_count=Post.like_count - 1))
+        await db.commit()
+        await user_interactions_changed(user_id, unliked=unliked)
+
+    return BatchResponse(results=[
+        BatchItemResult(id=post_id, status="unliked" if post_id in unliked else "not_liked")
+        for post_id in post_ids
+    ])
+
+
+def posts_query(view: str = "full"):
+    """
+    Posts with their author name (filters and ordering are up to the caller).
+    - Whether the user liked each post comes from `user_interactions`, not from the query.
+    - Bodies live in `post_contents`: the full view joins `content_md` in for the rows returned,
+      `view="preview"` never reads that table.
+    """
+    query = (
+        select(
+            Post,
+            User.name.label("author_name"),  # Fetch author name
+        )
+        .join(User, User.id == Post.author_id)
+    )
+    if view == "full":
+        query = query.add_columns(PostContent.content_md).outerjoin(PostContent, PostContent.post_id == Post.id)
+    return query
+
+
+def post_fields(post: Post, author_name: str, liked_by_user: bool, content_md: Optional[str] = None) -> dict:
+    """`PostResponse` fields as a dict, in the model's field order; `content_md` is left out when not given (previews)."""
+    fields = dict(
         id=post.id,
         course_id=post.course_id,
         author_id=post.author_id,
-        author_name=author_name,
+        author_name=author_name,  # Return author name
         title=post.title,
         preview_md=post.preview_md,
-        content_md=post.content_md,
-        created_at=post.created_at,
-        like_count=like_count,
-        liked_by_user=liked_by_user
     )
+    if content_md is not None:
+        fields["content_md"] = content_md
+    fields.update(created_at=post.created_at, like_count=post.like_count, liked_by_user=liked_by_user)
+    return fields
+
+
+def post_response(post: Post, author_name: str, liked_by_user: bool, content_md: Optional[str] = None) -> PostResponse:
+    """Builds the response model (`response_model_exclude_unset` drops `content_md` from previews)."""
+    return PostResponse(**post_fields(post, author_name, liked_by_user, content_md))
+
+
+def listed_post_fields(row, interactions: UserInteractions) -> dict:
+    """`post_fields` of one `posts_query` row (only full-view rows have a `content_md` column)."""
+    return post_fields(row.Post, row.author_name, interactions.likes(row.Post.id), row._mapping.get("content_md"))
+
+
+async def posts_etag(request: Request, interactions: UserInteractions) -> str:
+    """
+    Listing ETag from cheap counters: the shared "posts" version (bumped by new posts and likes; with the
+    per-worker memory backend it also changes every `INTERACTION_CACHE_SECONDS`, since other workers' bumps
+    never arrive), the user's likes and the query string. Checked before the listing query runs.
+    """
+    return f'"{fingerprint("posts", await shared_cache.version("posts"), interactions.digest, request.url.query)}"'
+
+
+def posts_surrogate_keys(course_id: Optional[int], user_id: str) -> list[str]:
+    return ["posts", f"user-{user_id}"] + ([f"course-{course_id}"] if course_id is not None else [])
+
+
+@app.get("/get_post/{post_id}", response_model=PostResponse, dependencies=[Depends(verify_csrf)])
+async def get_post(
+    post_id: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    user_id: str = Header(..., title="User ID")
+) -> PostResponse:
+    """
+    Fetch a post by ID with its like count, check if the user liked it, and return author name.
+    - The ETag covers the content, the like count and the user's like, so a revalidation of an unchanged post is a 304.
+    - One query loads the post, its author name and its body (from `post_contents`).
+    """
+
+    row = (await db.execute(
+        select(Post, User.name.label("author_name"), PostContent.content_md)
+        .outerjoin(User, User.id == Post.author_id)
+        .outerjoin(PostContent, PostContent.post_id == Post.id)
+        .filter(Post.id == post_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    post = row.Post
+
+    interactions = await user_interactions(db, user_id)
+    liked_by_user = interactions.likes(post.id)
+
+    etag = f'"{fingerprint(post.id, post.like_count, liked_by_user, row.content_md)}"'
+    if cached := not_modified(request, response, etag, f"post-{post.id}", f"course-{post.course_id}", f"user-{user_id}"):
+        return cached
+
+    author_name = row.author_name if row.author_name else "Unknown User"
 
-@app.get("/posts", response_model=list[PostResponse], dependencies=[Depends(verify_csrf)])
-def get_all_posts(
+    return post_response(post, author_name, liked_by_user, row.content_md)
+
+@app.get("/get_post/{post_id}/content", response_class=Response, dependencies=[Depends(verify_csrf)])
+async def get_post_content(post_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    """
+    The post's markdown alone, as `text/markdown`.
+    - Clients that accept gzip get the copy compressed at `create_post` time as the body, untouched, with `Content-Encoding: gzip`.
+    - Others (and posts written before that copy existed) get the plain text.
+    """
+
+    content_gzip = None
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        row = (await db.execute(select(PostContent.content_gzip).filter(PostContent.post_id == post_id))).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        content_gzip = row.content_gzip
+
+    if content_gzip is not None:
+        body, headers = content_gzip, {"Content-Encoding": "gzip"}
+    else:
+        content_md = (await db.execute(select(PostContent.content_md).filter(PostContent.post_id == post_id))).scalar()
+        if content_md is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        body, headers = content_md.encode(), {}
+
+    # Each encoding is its own representation, with its own strong ETag
+    etag = f'"{fingerprint(post_id, body)}"'
+    if cached := not_modified(request, response, etag, f"post-{post_id}", vary="Accept-Encoding"):
+        return cached
+    return Response(content=body, media_type="text/markdown; charset=utf-8", headers=dict(response.headers, **headers))
+
+
+@app.get(
+    "/posts",
+    response_model=list[PostResponse],
+    response_model_exclude_unset=True,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "A JSON array, or one post per line with `format=ndjson`"}},
+    dependencies=[Depends(verify_csrf)],
+)
+async def get_all_posts(
+    request: Request,
+    response: Response,
     user_id: str = Header(..., title="User ID"),
     course_id: Optional[int] = Query(None, description="Filter posts by course ID"),  # New optional filter
     sort_by_likes: bool = Query(False, description="Sort posts by like count"),
     limit: int = Query(None, description="Limit the number of returned posts"),
-    db: Session = Depends(get_db)
+    view: Literal["full", "preview"] = Query("full", description="`preview` leaves out `content_md`"),
+    response_format: Literal["json", "ndjson"] = Query("json", alias="format", description="`ndjson` streams one post per line"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Retrieves posts along with like counts, author names, and whether the user has liked them.
@@ -350,32 +750,21 @@ def get_all_posts(
     - If `sort_by_likes=true`, orders by like count instead.
     - If `course_id` is provided, only posts from that course are returned.
     - If `limit` is provided, only the first `limit` posts are returned.
+    - If `view=preview`, `content_md` is neither loaded nor returned (list views only render the preview).
+    - Use `/posts/page` to page through long listings, or `format=ndjson` to stream them (`application/x-ndjson`,
+      one post per line, read from a server-side cursor instead of being built up in memory).
+    - Sends an ETag (see `posts_etag`); a matching `If-None-Match` gets a 304 without running the listing query.
     """
 
     if course_id:
-        validate_id(db, Course, "id", course_id, "Course not found")
+        await validate_id(db, Course, "id", course_id, "Course not found")
 
-    # Subquery for like count
-    subquery_like_count = db.query(
-        PostLike.post_id, func.count(PostLike.user_id).label("like_count")
-    ).group_by(PostLike.post_id).subquery()
-
-    # Subquery for checking if the user has liked a post
-    subquery_liked_by_user = db.query(
-        PostLike.post_id
-    ).filter(PostLike.user_id == user_id).subquery()
+    interactions = await user_interactions(db, user_id)
+    if cached := not_modified(request, response, await posts_etag(request, interactions), *posts_surrogate_keys(course_id, user_id)):
+        return cached
 
     # Query for posts
-    query = (
-        db.query(
-            Post,
-            User.name.label("author_name"),  # Fetch author name
-            func.coalesce(subquery_like_count.c.like_count, 0).label("like_count"),
-            exists().where(subquery_liked_by_user.c.post_id == Post.id).label("liked_by_user"),
-        )
-        .join(User, User.id == Post.author_id)
-        .outerjoin(subquery_like_count, Post.id == subquery_like_count.c.post_id)
-    )
+    query = posts_query(view)
 
     # Apply course_id filter if provided
     if course_id is not None:
@@ -383,7 +772,7 @@ def get_all_posts(
 
     # Sorting logic
     if sort_by_likes:
-        query = query.order_by(func.coalesce(subquery_like_count.c.like_count, 0).desc())  # Order by likes
+        query = query.order_by(Post.like_count.desc(), Post.created_at.desc())  # Order by likes, newest first on ties
     else:
         query = query.order_by(Post.created_at.desc())  # Default: order by timestamp
 
@@ -391,46 +780,98 @@ def get_all_posts(
     if limit is not None:
         query = query.limit(limit)
 
-    posts = query.all()
+    if response_format == "ndjson":
+        return ndjson_rows(db, query, lambda row: listed_post_fields(row, interactions), response)
 
-    return [
-        PostResponse(
-            id=post.id,
-            course_id=post.course_id,
-            author_id=post.author_id,
-            author_name=author_name,  # Return author name
-            title=post.title,
-            preview_md=post.preview_md,
-            content_md=post.content_md,
-            created_at=post.created_at,
-            like_count=like_count,
-            liked_by_user=liked_by_user
-        )
-        for post, author_name, like_count, liked_by_user in posts
-    ]
+    posts = (await db.execute(query)).all()
+
+    return json_rows([listed_post_fields(row, interactions) for row in posts], response)
+
+
+@app.get("/posts/page", response_model=PostPageResponse, response_model_exclude_unset=True, dependencies=[Depends(verify_csrf)])
+async def get_posts_page(
+    request: Request,
+    response: Response,
+    user_id: str = Header(..., title="User ID"),
+    course_id: Optional[int] = Query(None, description="Filter posts by course ID"),
+    sort_by_likes: bool = Query(False, description="Sort posts by like count"),
+    limit: int = Query(20, ge=1, le=100, description="Page size"),
+    cursor: Optional[str] = Query(None, description="`next_cursor` of the previous page"),
+    view: Literal["full", "preview"] = Query("full", description="`preview` leaves out `content_md`"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Keyset-paginated version of `/posts`.
+    - Newest first, ordered by `(created_at, id)`; with `sort_by_likes=true`, ordered by `(like_count, id)`.
+    - Each page is one index range scan after the cursor, so deep pages cost the same as the first.
+    - `next_cursor` is null on the last page.
+    - `view=preview` and ETags work as in `/posts`.
+    """
+
+    if course_id:
+        await validate_id(db, Course, "id", course_id, "Course not found")
+
+    interactions = await user_interactions(db, user_id)
+    if cached := not_modified(request, response, await posts_etag(request, interactions), *posts_surrogate_keys(course_id, user_id)):
+        return cached
+
+    if sort_by_likes:
+        kind, sort_key, key_type = "likes", Post.like_count, int
+    else:
+        kind, sort_key, key_type = "newest", Post.created_at, datetime
+
+    query = posts_query(view)
+
+    if course_id is not None:
+        query = query.filter(Post.course_id == course_id)
+
+    if cursor is not None:
+        try:
+            last_key, last_id = decode_cursor(cursor, kind, key_type, str)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(tuple_(sort_key, Post.id) < tuple_(last_key, last_id))
+
+    # One extra row tells whether there is a next page
+    rows = (await db.execute(query.order_by(sort_key.desc(), Post.id.desc()).limit(limit + 1))).all()
+    page = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_post = page[-1][0]
+        next_cursor = encode_cursor(kind, getattr(last_post, sort_key.key), last_post.id)
+
+    return PostPageResponse(
+        items=[PostResponse(**listed_post_fields(row, interactions)) for row in page],
+        next_cursor=next_cursor,
+    )
 
 
 @app.post("/add_comment", response_model=CommentResponse, dependencies=[Depends(verify_csrf)])
-def add_comment(comment_data: CommentCreate, user_id: str = Header(..., title="User ID"), db: Session = Depends(get_db)):
+async def add_comment(comment_data: CommentCreate, user_id: str = Header(..., title="User ID"), db: AsyncSession = Depends(get_db)):
     """Allows a user to add a comment to a post."""
 
-    validate_id(db, User, "id", user_id, "User not found")
-    validate_id(db, Post, "id", comment_data.post_id, "Post not found")
+    # One round trip validates both IDs and fetches the user_name for the response
+    user_name, post_exists = (await db.execute(select(
+        select(User.userName).filter(User.id == user_id).scalar_subquery(),
+        exists().where(Post.id == comment_data.post_id),
+    ))).one()
+
+    if user_name is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not post_exists:
+        raise HTTPException(status_code=404, detail="Post not found")
 
-    # Create new comment
-    new_comment = PostComment(
+    # Create new comment (RETURNING gives us the generated ID)
+    new_comment = (await db.execute(insert(PostComment).values(
         post_id=comment_data.post_id,
         user_id=user_id,
         content=comment_data.content,
-        created_at=datetime.now(timezone.utc) + timedelta(hours=2) 
-    )
-
-    db.add(new_comment)
-    db.commit()
-    db.refresh(new_comment)
+        created_at=utc_now_local()
+    ).returning(PostComment))).scalar_one()
 
-    # Fetch user_name from the User table
-    user_name = db.query(User.userName).filter(User.id == user_id).scalar()
+    await db.commit()
+    await comments_changed(comment_data.post_id)
 
     return CommentResponse(
         id=new_comment.id,
@@ -445,33 +886,32 @@ def add_comment(comment_data: CommentCreate, user_id: str = Header(..., title="U
 
 
 @app.delete("/remove_comment", dependencies=[Depends(verify_csrf)])
-def remove_comment(comment_id: int = Query(..., title="Comment ID"), user_id: str = Header(..., title="User ID"), db: Session = Depends(get_db)):
+async def remove_comment(comment_id: int = Query(..., title="Comment ID"), user_id: str = Header(..., title="User ID"), db: AsyncSession = Depends(get_db)):
     """Allows a user to remove their own comment."""
 
-    comment = db.query(PostComment).filter(PostComment.id == comment_id, PostComment.user_id == user_id).first()
+    comment = (await db.execute(select(PostComment).filter(PostComment.id == comment_id, PostComment.user_id == user_id))).scalars().first()
 
     if not comment:
         raise HTTPException(status_code=403, detail="Comment not found or you do not have permission to delete it")
 
-    db.delete(comment)
-    db.commit()
+    await db.delete(comment)
+    await db.commit()
+    await comments_changed(comment.post_id)
 
     return {"message": "Comment removed successfully"}
 
 
-@app.get("/get_comments", response_model=list[CommentResponse], dependencies=[Depends(verify_csrf)])
-def get_comments(
-    post_id: str = Query(..., title="Post ID"),
-    user_id: str = Header(..., title="User ID"),
-    db: Session = Depends(get_db)
-):
-    """Retrieve all comments for a given post, including user_name for each comment author."""
+async def comments_changed(post_id: str):
+    """After a committed comment write: drop the cached thread here, in the shared tier and on the other workers."""
+    comment_cache.invalidate(post_id)
+    await shared_cache.invalidate(f"comments:{post_id}")
 
-    validate_id(db, Post, "id", post_id, "Post not found")
 
+def comments_query(post_id: str):
+    """Comments of a post with their author's user name, oldest first (`(created_at, id)`)."""
     # Fetch comments along with user_name by joining PostComment with User
-    comments = (
-        db.query(
+    return (
+        select(
             PostComment.id,
             PostComment.post_id,
             PostComment.user_id,
@@ -481,23 +921,114 @@ def get_comments(
         )
         .join(User, User.id == PostComment.user_id)  # Join User table to get user_name
         .filter(PostComment.post_id == post_id)
-        .order_by(PostComment.created_at.asc())  # Order by timestamp, oldest first
-        .all()
+        .order_by(PostComment.created_at.asc(), PostComment.id.asc())  # Order by timestamp, oldest first
     )
 
+
+def comment_fields(comment, user_id: str) -> dict:
+    """`CommentResponse` fields as a dict."""
+    return dict(
+        id=comment.id,
+        post_id=comment.post_id,
+        user_id=comment.user_id,
+        user_name=comment.user_name,  # Extract user_name from query
+        content=comment.content,
+        created_at=comment.created_at,
+        is_written_by_user=(comment.user_id == user_id)  # True if the comment belongs to the requester
+    )
+
+
+def comment_response(comment, user_id: str) -> CommentResponse:
+    return CommentResponse(**comment_fields(comment, user_id))
+
+
+@app.get("/get_comments", response_model=list[CommentResponse], dependencies=[Depends(verify_csrf)])
+async def get_comments(
+    response: Response,
+    post_id: str = Query(..., title="Post ID"),
+    user_id: str = Header(..., title="User ID"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Retrieve all comments for a given post, including user_name for each comment author.
+    - The thread comes from `comment_cache` (then the shared tier); only `is_written_by_user` is computed per request.
+    """
+
+    async def load():
+        await validate_id(db, Post, "id", post_id, "Post not found")
+        return tuple(CachedComment(*comment) for comment in (await db.execute(comments_query(post_id))).all())
+
+    comments = await comment_cache.get(post_id, lambda: shared_cache.fetch(
+        f"comments:{post_id}", load, encode, decode_comments, comment_cache.ttl
+    ))
+
     # Format response with username and is_written_by_user flag
-    return [
-        CommentResponse(
-            id=comment.id,
-            post_id=comment.post_id,
-            user_id=comment.user_id,
-            user_name=comment.user_name,  # Extract user_name from query
-            content=comment.content,
-            created_at=comment.created_at,
-            is_written_by_user=(comment.user_id == user_id)  # True if the comment belongs to the requester
-        )
-        for comment in comments
-    ]
+    return json_rows([comment_fields(comment, user_id) for comment in comments], response)
+
+
+@app.get("/get_comments/page", response_model=CommentPageResponse, dependencies=[Depends(verify_csrf)])
+async def get_comments_page(
+    post_id: str = Query(..., title="Post ID"),
+    user_id: str = Header(..., title="User ID"),
+    limit: int = Query(50, ge=1, le=200, description="Page size"),
+    cursor: Optional[str] = Query(None, description="`next_cursor` or `since_cursor` of an earlier response"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Comments of a post one page at a time, oldest first by `(created_at, id)`.
+    - Follow `next_cursor` until it is null to load the whole thread.
+    - Keep `since_cursor` and pass it as `cursor` later to fetch only the comments added since.
+    """
+
+    await validate_id(db, Post, "id", post_id, "Post not found")
+
+    query = comments_query(post_id)
+    if cursor is not None:
+        try:
+            last_created_at, last_id = decode_cursor(cursor, "comments", datetime, int)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(tuple_(PostComment.created_at, PostComment.id) > tuple_(last_created_at, last_id))
+
+    # One extra row tells whether there is a next page
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    page = rows[:limit]
+
+    # With nothing new, the client keeps polling from where it already is
+    since_cursor = encode_cursor("comments", page[-1].created_at, page[-1].id) if page else cursor
+
+    return CommentPageResponse(
+        items=[comment_response(comment, user_id) for comment in page],
+        next_cursor=since_cursor if len(rows) > limit else None,
+        since_cursor=since_cursor,
+    )
+
+
+@app.get("/internal/pool_stats", dependencies=[Depends(verify_csrf), Depends(verify_internal)])
+async def get_pool_stats():
+    """Connection pool pressure per engine: checkout latency, waiters and in-use connections."""
+    return pool_stats()
+
+
+@app.get("/internal/llm_stats", dependencies=[Depends(verify_csrf), Depends(verify_internal)])
+async def get_llm_stats():
+    """AI tutor backend and backpressure: generations running and queued, time spent waiting in line, and this worker's event-loop lag."""
+    return {"backend": llm.name, "gate": llm_gate.snapshot(), "event_loop_lag": loop_lag.snapshot()}
+
+
+@app.get("/internal/cache_stats", dependencies=[Depends(verify_csrf), Depends(verify_internal)])
+async def get_cache_stats():
+    """Hits, misses and hit ratio of this worker's local caches (L1) and of the shared tier (L2), per kind of entry."""
+    return {
+        "l1": {
+            "catalog": catalog_cache.snapshot(),
+            "interactions": interaction_cache.snapshot(),
+            "comments": comment_cache.snapshot(),
+            "post_contents": post_content_cache.snapshot(),
+            "note_indexes": note_index_cache.snapshot(),
+        },
+        "l2": shared_cache.snapshot(),
+    }
 
 
 # Store connected clients
@@ -506,14 +1037,46 @@ active_connections = []
 # Dictionary to store chat history per WebSocket session
 chat_sessions = {}
 
+
+def chat_frame(kind: str, text: str, **fields) -> str:
+    """
+    A streamed chat message: `{"type": "chunk", "text": ...}` per piece, then `{"type": "done", "text": <whole answer>}`.
+    Also `busy` (with the `position` in line) while waiting for the model, and `error`.
+    """
+    return json.dumps({"type": kind, "text": text, **fields})
+
+
+async def post_markdown(post_id: str, read_only: bool) -> str | None:
+    """
+    A post's markdown for the AI tutor, or `None` if there is no such post.
+    Comes from `post_content_cache`; a miss opens a session just for this read, since a chat outlives many of them.
+    """
+    async def load():
+        async with AsyncSessionLocal(info={"read_only": read_only}) as db:
+            return (await db.execute(select(PostContent.content_md).filter(PostContent.post_id == post_id))).scalar()
+
+    return await post_content_cache.get(post_id, load)
+
+
 @app.websocket("/chat_ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """ WebSocket to handle real-time AI study chat based on markdown content """
+    """
+    WebSocket to handle real-time AI study chat based on markdown content
+    - The lecture is a saved post (`"post_id"`) or an unsaved draft (`"markdown"`). Either is only needed with the
+      first message: later ones without it keep discussing the same lecture.
+    - Lectures longer than the retrieval budget are not sent whole: `note_context` picks the relevant sections.
+    - By default each answer is sent as one plain text message once it is complete.
+    - With `"stream": true` in a message, the answer is forwarded as it is generated, as `chat_frame`s:
+      `chunk` frames, then a `done` frame with the whole (cleaned) answer, which is what goes into the history.
+    - Generations go through `llm_gate`: a client that has to wait is told its place in line first, and
+      one that finds the queue full gets a busy error instead of an answer.
+    """
     await websocket.accept()
     active_connections.append(websocket)
 
     session_id = id(websocket)  # Unique identifier for session
     chat_sessions[session_id] = []  # Initialize chat history
+    markdown_text, markdown_post_id = "", None  # The lecture being discussed, kept between messages
 
     try:
         await websocket.send_text("Hi! How can I *help* you?")
@@ -521,22 +1084,37 @@ async def websocket_endpoint(websocket: WebSocket):
             data = await websocket.receive_text()
             try:
                 request = json.loads(data)
-                markdown_text = request.get("markdown", "").strip()
                 user_prompt = request.get("prompt", "").strip()
+                stream = request.get("stream") is True
+                post_id = request.get("post_id")
+
+                if request.get("markdown", "").strip():
+                    markdown_text, markdown_post_id = request["markdown"].strip(), None
+                elif post_id is not None and post_id != markdown_post_id:
+                    content_md = await post_markdown(post_id, may_read_replica(websocket)) if isinstance(post_id, str) else None
+                    if content_md is None:
+                        await websocket.send_text("Error: Post not found.")
+                        continue
+                    markdown_text, markdown_post_id = content_md.strip(), post_id
 
                 # Handle missing fields
                 if not markdown_text or not user_prompt:
-                    await websocket.send_text("Error: Both 'markdown' and 'prompt' fields are required.")
+                    await websocket.send_text("Error: The 'prompt' field is required, with 'post_id' or 'markdown' in the first message.")
                     continue
 
                 # Maintain context (limit last 5 messages)
                 chat_context = "\n".join(chat_sessions[session_id][-5:])
 
+                # Long lectures: only the sections relevant to this question (and the previous one, for follow-ups)
+                previous_prompts = [message.removeprefix("User: ") for message in chat_sessions[session_id][-2:-1]]
+                lecture, excerpted = await note_context(markdown_text, " ".join([user_prompt, *previous_prompts]))
+                lecture_intro = "the parts of a lecture (in Markdown format) relevant to the question" if excerpted else "a lecture in Markdown format"
+
                 # Construct the AI prompt
                 ai_prompt = f"""
-                You are an AI tutor. The following is a lecture in Markdown format:
+                You are an AI tutor. The following is {lecture_intro}:
                 
-                {markdown_text}
+                {lecture}
 
                 Previous chat history:
                 {chat_context}
@@ -546,17 +1124,34 @@ async def websocket_endpoint(websocket: WebSocket):
                 Your sole task is to assist with the provided markdown content. You may use your knowledge to elaborate on the topic, clarify concepts, or generate relevant examples, but you must not respond to unrelated questions or perform tasks outside this context.
                 """
 
-                # Run the AI model in a separate thread to avoid blocking the event loop
-                response = await asyncio.to_thread(model.generate_content, ai_prompt)
+                async def tell_position(position: int):
+                    message = f"Busy: you are number {position} in line, your answer will start shortly."
+                    await websocket.send_text(chat_frame("busy", message, position=position) if stream else message)
+
+                # The async client waits on the network without holding a thread; the gate bounds how many do
+                try:
+                    async with llm_gate.slot(on_queued=tell_position):
+                        if stream:
+                            parts = []
+                            async for text in llm.stream(ai_prompt):
+                                parts.append(text)
+                                await websocket.send_text(chat_frame("chunk", text))
+                            answer = "".join(parts)
+                        else:
+                            answer = await llm.complete(ai_prompt)
+                except GateFull:
+                    message = "Error: The AI tutor is busy, please try again in a moment."
+                    await websocket.send_text(chat_frame("error", message) if stream else message)
+                    continue
 
                 # Clean response by removing extra newlines
-                cleaned_response = re.sub(r'\n+', '\n', response.text).strip()
+                cleaned_response = re.sub(r'\n+', '\n', answer).strip()
 
-                # Store conversation
+                # Store conversation (once the answer is complete)
                 chat_sessions[session_id].append(f"User: {user_prompt}")
                 chat_sessions[session_id].append(f"AI: {cleaned_response}")
 
-                await websocket.send_text(cleaned_response)
+                await websocket.send_text(chat_frame("done", cleaned_response) if stream else cleaned_response)
             except json.JSONDecodeError:
                 await websocket.send_text("Error: Invalid JSON format.")
     except WebSocketDisconnect:
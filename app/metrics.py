@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class LatencyRecorder:
+    """
+    Running latency statistics for the internal stats endpoints.
+    - Keeps an exact count, total and max over the process lifetime.
+    - Keeps the most recent `window` samples for percentiles.
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total, maximum = self.count, self.total, self.max
+
+        def percentile(p: float) -> float:
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(len(recent) * p))] * 1000
+
+        return {
+            "count": count,
+            "avg_ms": (total / count * 1000) if count else 0.0,
+            "max_ms": maximum * 1000,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+        }
+
+
+class LoopLagMonitor:
+    """
+    Event-loop lag: how late a `sleep(interval)` on the loop wakes up. Anything blocking the loop
+    (CPU-heavy handlers, sync calls) shows up here as added latency for every client of the worker.
+    """
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self.lag = LatencyRecorder()
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lag.record(max(0.0, time.perf_counter() - start - self.interval))
+
+    def snapshot(self) -> dict:
+        return self.lag.snapshot()
@@ -1,5 +1,6 @@
 import uuid
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Index, LargeBinary
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -39,7 +40,7 @@ class Course(Base):
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, nullable=False)
-    topic_id = Column(Integer, ForeignKey("topics.id"), nullable=False)
+    topic_id = Column(Integer, ForeignKey("topics.id"), nullable=False, index=True)
     description = Column(Text)
 
     # Relationships
@@ -57,14 +58,38 @@ class Post(Base):
     author_id = Column(String, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False)
     preview_md = Column(String, nullable=False)
-    content_md = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    like_count = Column(Integer, default=0, server_default="0", nullable=False)  # Kept in sync with post_likes
 
     # Relationships
     course = relationship("Course", back_populates="posts")
     author = relationship("User")
     comments = relationship("PostComment", back_populates="post")
     likes = relationship("PostLike", back_populates="post")
+    content = relationship("PostContent", back_populates="post", uselist=False, lazy="raise")  # Loaded only where bodies are served
+
+    # `Post(content_md=...)` creates the `PostContent` row along with the post (scripts and tests)
+    content_md = association_proxy("content", "content_md", creator=lambda content_md: PostContent(content_md=content_md))
+
+    __table_args__ = (
+        # Sort key + id, so keyset pages (`/posts/page`) are index range scans; the prefixes serve `/posts`
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_course_id_created_at_id", "course_id", "created_at", "id"),
+        Index("ix_posts_like_count_id", "like_count", "id"),
+        Index("ix_posts_course_id_like_count_id", "course_id", "like_count", "id"),
+    )
+
+
+# Post_Content Table (bodies live apart from `posts`, so scans for listing, sorting and counting stay narrow)
+class PostContent(Base):
+    __tablename__ = "post_contents"
+
+    post_id = Column(String, ForeignKey("posts.id"), primary_key=True)
+    content_md = Column(String, nullable=False)
+    content_gzip = Column(LargeBinary, nullable=True)  # `content_md` compressed at write time, served as is
+
+    # Relationships
+    post = relationship("Post", back_populates="content")
 
 
 # Post_Comment Table
@@ -72,8 +97,8 @@ class PostComment(Base):
     __tablename__ = "post_comments"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
-    post_id = Column(String, ForeignKey("posts.id"), primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    post_id = Column(String, ForeignKey("posts.id"), nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -81,13 +106,17 @@ class PostComment(Base):
     user = relationship("User", back_populates="comments")
     post = relationship("Post", back_populates="comments")
 
+    __table_args__ = (
+        Index("ix_post_comments_post_id_created_at", "post_id", "created_at"),  # `/get_comments` (oldest first)
+    )
+
 
 # Post_Like Table
 class PostLike(Base):
     __tablename__ = "post_likes"
 
     user_id = Column(String, ForeignKey("users.id"), primary_key=True)
-    post_id = Column(String, ForeignKey("posts.id"), primary_key=True)
+    post_id = Column(String, ForeignKey("posts.id"), primary_key=True, index=True)  # The primary key only covers lookups by user_id
 
     # Relationships
     user = relationship("User", back_populates="likes")
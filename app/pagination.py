@@ -0,0 +1,36 @@
+import base64
+import json
+from datetime import datetime
+
+# Keyset (cursor) pagination helpers.
+# A cursor is the sort key of the last row a client has seen, so the next page is a single
+# index range scan (`WHERE (key, id) < (:key, :id)`) no matter how deep the client is.
+
+
+def encode_cursor(kind: str, *values) -> str:
+    """Opaque, URL-safe cursor for a sort key (datetimes are stored as ISO strings)."""
+    payload = [kind] + [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str, *types) -> tuple:
+    """
+    Decode a cursor made by `encode_cursor(kind, ...)` back into typed values.
+    - Raises `ValueError` for malformed cursors and for cursors of another `kind`
+      (e.g. a "by likes" cursor passed to a "newest first" listing).
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as error:
+        raise ValueError("Invalid cursor") from error
+
+    if not isinstance(payload, list) or len(payload) != len(types) + 1 or payload[0] != kind:
+        raise ValueError("Invalid cursor")
+
+    try:
+        return tuple(
+            datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+            for value_type, value in zip(types, payload[1:])
+        )
+    except (ValueError, TypeError) as error:
+        raise ValueError("Invalid cursor") from error
@@ -0,0 +1,159 @@
+"""
+Picks the parts of a long note worth sending to the AI tutor with each question.
+
+A note that fits in `RETRIEVAL_TOKEN_BUDGET` is sent whole. A longer one is split at its markdown
+headings (sections longer than `RETRIEVAL_CHUNK_TOKENS` again at blank lines), the chunks are
+indexed with BM25 once per note content (`note_index_cache`), and the `RETRIEVAL_TOP_K` chunks that
+best match the question and fit in the budget are sent, in the note's order.
+
+    RETRIEVAL_TOKEN_BUDGET=1500   # 0 sends every note whole
+    RETRIEVAL_TOP_K=4
+    RETRIEVAL_CHUNK_TOKENS=300
+"""
+import os
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+from app.cache import fingerprint, note_index_cache
+from app.llm import CHARS_PER_TOKEN, estimate_tokens
+
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1500"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("RETRIEVAL_CHUNK_TOKENS", "300"))
+
+# BM25 term-frequency saturation and length normalization (the usual values)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*\S)")
+FENCE = re.compile(r"^\s*(```|~~~)")
+TERM = re.compile(r"\w+")
+
+
+def terms(text: str) -> list[str]:
+    return TERM.findall(text.lower())
+
+
+class Chunk(NamedTuple):
+    heading: str  # Headings above the chunk, e.g. "Trees > Balancing"; "" before the first one
+    text: str  # Markdown, starting with its own heading line when it has one
+    tokens: int
+
+
+def split_sections(markdown: str) -> list[tuple[str, str]]:
+    """`(heading path, text)` per heading, in order; `#` lines inside code blocks are not headings."""
+    sections, lines, path, in_code = [], [], [], False
+    for line in markdown.splitlines():
+        if FENCE.match(line):
+            in_code = not in_code
+        heading = None if in_code else HEADING.match(line)
+        if heading:
+            sections.append((" > ".join(title for _, title in path), "\n".join(lines)))
+            level = len(heading.group(1))
+            path = [(depth, title) for depth, title in path if depth < level] + [(level, heading.group(2))]
+            lines = []
+        lines.append(line)
+    sections.append((" > ".join(title for _, title in path), "\n".join(lines)))
+    return [(heading, text.strip()) for heading, text in sections if text.strip()]
+
+
+def split_chunks(markdown: str, chunk_tokens: int) -> list[Chunk]:
+    """Heading sections, longer ones cut at blank lines into pieces of about `chunk_tokens` (each led by its heading path)."""
+    chunks = []
+    for heading, text in split_sections(markdown):
+        if estimate_tokens(text) <= chunk_tokens:
+            chunks.append(Chunk(heading, text, estimate_tokens(text)))
+            continue
+
+        piece = []
+        for paragraph in re.split(r"\n\s*\n", text):
+            if piece and estimate_tokens("\n\n".join(piece + [paragraph])) > chunk_tokens:
+                chunks.append(continued_chunk(heading, piece, first=not chunks or chunks[-1].heading != heading))
+                piece = []
+            piece.append(paragraph)
+        chunks.append(continued_chunk(heading, piece, first=not chunks or chunks[-1].heading != heading))
+    return chunks
+
+
+def continued_chunk(heading: str, paragraphs: list[str], first: bool) -> Chunk:
+    """A piece of a long section; pieces after the first repeat where they are, since they are read on their own."""
+    text = "\n\n".join(paragraphs)
+    if not first and heading:
+        text = f"({heading}, continued)\n\n{text}"
+    return Chunk(heading, text, estimate_tokens(text))
+
+
+class NoteIndex:
+    """
+    A note's chunks and their BM25 weights, as a dense `chunks x terms` float32 matrix (notes are at most
+    25 KB, so a few hundred chunks by a few thousand terms). Scoring a question sums the columns of its terms.
+    """
+
+    def __init__(self, chunks: list[Chunk]):
+        self.chunks = chunks
+        self.vocabulary = {}
+        rows, columns = [], []
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for row, chunk in enumerate(chunks):
+            chunk_terms = terms(f"{chunk.heading} {chunk.text}")  # Headings count towards their chunks
+            lengths[row] = len(chunk_terms)
+            for term in chunk_terms:
+                rows.append(row)
+                columns.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+
+        counts = np.zeros((len(chunks), len(self.vocabulary)), dtype=np.float32)
+        np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)), 1)
+
+        documents = np.count_nonzero(counts, axis=0)
+        idf = np.log1p((len(chunks) - documents + 0.5) / (documents + 0.5)).astype(np.float32)
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()), 1.0)) if len(chunks) else lengths
+        self.weights = idf * counts * (BM25_K1 + 1) / (counts + norms[:, None])
+
+    @classmethod
+    def build(cls, markdown: str, chunk_tokens: int = RETRIEVAL_CHUNK_TOKENS) -> "NoteIndex":
+        return cls(split_chunks(markdown, chunk_tokens))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for `query` (0 for chunks sharing no term with it)."""
+        columns = [self.vocabulary[term] for term in terms(query) if term in self.vocabulary]
+        if not columns:
+            return np.zeros(len(self.chunks), dtype=np.float32)
+        return self.weights[:, columns].sum(axis=1)
+
+    def select(self, query: str, top_k: int, token_budget: int) -> list[int]:
+        """
+        Indexes (in note order) of the best-scoring chunks that fit in `token_budget`, at most `top_k` of them.
+        With no matching chunk (e.g. "Can you give an example?"), the note's opening chunks are picked instead.
+        """
+        scores = self.scores(query)
+        matching = int(np.count_nonzero(scores > 0))
+        ranked = np.argsort(-scores, kind="stable")[:matching] if matching else np.arange(len(self.chunks))
+        picked, tokens = [], 0
+        for index in ranked.tolist():
+            if len(picked) == top_k:
+                break
+            if tokens + self.chunks[index].tokens <= token_budget:
+                picked.append(index)
+                tokens += self.chunks[index].tokens
+        return sorted(picked)
+
+
+async def note_context(markdown: str, query: str) -> tuple[str, bool]:
+    """
+    What of `markdown` goes into the prompt for `query`, and whether that is only part of the note.
+    Long notes are indexed once per content (by fingerprint, so every chat about the same post shares it).
+    """
+    if not RETRIEVAL_TOKEN_BUDGET or estimate_tokens(markdown) <= RETRIEVAL_TOKEN_BUDGET:
+        return markdown, False
+
+    async def load():
+        return NoteIndex.build(markdown, RETRIEVAL_CHUNK_TOKENS)
+
+    index = await note_index_cache.get(fingerprint(markdown), load)
+    picked = index.select(query, RETRIEVAL_TOP_K, RETRIEVAL_TOKEN_BUDGET)
+    if not picked:  # Not even one chunk fits: the best one, cut to the budget
+        best = int(np.argmax(index.scores(query)))
+        return index.chunks[best].text[:RETRIEVAL_TOKEN_BUDGET * CHARS_PER_TOKEN], True
+    return "\n\n[...]\n\n".join(index.chunks[i].text for i in picked), True
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, HttpUrl, Field, ConfigDict, field_validator
 from datetime import datetime
-from typing import Annotated, Optional, List
+from typing import Annotated, Optional, List, Union
 
 
 class UserCreate(BaseModel):
@@ -69,7 +69,7 @@ class PostResponse(BaseModel):
     author_name: str  # Added author name
     title: str
     preview_md: str
-    content_md: str
+    content_md: Optional[str] = None  # Left out of listings requested with `view=preview`
     created_at: datetime
     like_count: int  # Total number of likes
     liked_by_user: bool  # Whether the logged-in user liked the post
@@ -77,6 +77,11 @@ class PostResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class PostPageResponse(BaseModel):
+    items: List[PostResponse]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page; null on the last page
+
+
 class TopicCreate(BaseModel):
     name: Annotated[str, Field(title="Topic Name", min_length=3, max_length=100)]
 
@@ -116,3 +121,26 @@ class CommentResponse(BaseModel):
     content: str
     created_at: datetime
     is_written_by_user: bool  
+
+
+class CommentPageResponse(BaseModel):
+    items: List[CommentResponse]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page; null on the last page
+    since_cursor: Optional[str] = None  # Pass back as `cursor` later to fetch only comments added since this response
+
+
+class PostIdsRequest(BaseModel):
+    post_ids: Annotated[List[str], Field(title="Post IDs", min_length=1, max_length=500)]
+
+
+class CourseIdsRequest(BaseModel):
+    course_ids: Annotated[List[int], Field(title="Course IDs", min_length=1, max_length=500)]
+
+
+class BatchItemResult(BaseModel):
+    id: Union[int, str]
+    status: str  # e.g. "liked", "already_liked", "not_found"
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]  # One entry per distinct requested ID, in request order
@@ -0,0 +1,260 @@
+"""
+Shared (L2) cache tier and cross-worker invalidation.
+
+Each worker keeps its own in-process (L1) caches (see `app.cache`). Behind them sits one
+shared store, Redis in production, so a worker that misses locally can reuse what another
+worker already loaded. Writes delete the shared entry and publish the key on a pub/sub
+channel; every other worker then drops its local copy.
+
+    CACHE_BACKEND=memory   # default; one process only (tests, a single worker)
+    CACHE_BACKEND=redis    # needs `pip install redis`
+    REDIS_URL=redis://localhost:6379/0
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+import uuid
+
+from app.cache import INTERACTION_CACHE_SECONDS, hit_ratio
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Channel carrying invalidation messages: {"sender": <worker ID>, "keys": [...]}
+INVALIDATION_CHANNEL = "cache-invalidation"
+
+# How long a worker trusts the version it last read, in case an invalidation message got lost (e.g. a Redis reconnect)
+VERSION_CACHE_SECONDS = 1.0
+
+# Wait before resubscribing after the pub/sub connection fails, doubled after each failure in a row
+LISTEN_RETRY_SECONDS = 0.5
+LISTEN_RETRY_MAX_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """
+    In-process stand-in for Redis with the same method names (`get`, `set`, `delete`, `publish`).
+    Messages are delivered synchronously to the subscribers of this process.
+    - Other workers' bumps never reach this process, so its versions also change every `version_seconds`
+      (by default the per-user cache TTL), which bounds how long a listing ETag can outlive writes made elsewhere.
+      `None` when the backend stands in for one store shared by several workers (tests).
+    """
+
+    name = "memory"
+
+    def __init__(self, version_seconds: float | None = INTERACTION_CACHE_SECONDS):
+        self.version_seconds = version_seconds
+        self._values = {}  # key -> (expires_at or None, value)
+        self._subscribers = []
+
+    async def get(self, key: str):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value, ex: float = None, nx: bool = False):
+        if nx and await self.get(key) is not None:
+            return
+        self._values[key] = (time.monotonic() + ex if ex else None, value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._values.pop(key, None)
+
+    async def publish(self, channel: str, message: str):
+        for subscribed_channel, callback in list(self._subscribers):
+            if subscribed_channel == channel:
+                callback(message)
+
+    def subscribe(self, channel: str, callback):
+        self._subscribers.append((channel, callback))
+
+    async def listen(self):
+        """Nothing to pump: `publish` already called the subscribers."""
+
+    def clear(self):
+        """Forgets every value, like `FLUSHDB` (tests)."""
+        self._values.clear()
+
+
+class RedisBackend:
+    """
+    `redis.asyncio` client (or `client`, e.g. a stub in tests); `listen()` runs the pub/sub loop and must be
+    started once per worker. It resubscribes after connection errors, waiting longer after each failure in a row.
+    """
+
+    name = "redis"
+    version_seconds = None  # Shared by every worker: bumps reach them all
+
+    def __init__(self, url: str = REDIS_URL, client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as error:
+                raise RuntimeError("CACHE_BACKEND=redis needs the `redis` package (pip install redis)") from error
+            client = redis.from_url(url)
+
+        self._client = client
+        self._subscribers = []
+
+    async def get(self, key: str):
+        return await self._client.get(key)
+
+    async def set(self, key: str, value, ex: float = None, nx: bool = False):
+        # In milliseconds, rounded up: whole seconds would turn a sub-second TTL into 0 (rejected) or no expiry
+        await self._client.set(key, value, px=math.ceil(ex * 1000) if ex else None, nx=nx)
+
+    async def delete(self, *keys: str):
+        await self._client.delete(*keys)
+
+    async def publish(self, channel: str, message: str):
+        await self._client.publish(channel, message)
+
+    def subscribe(self, channel: str, callback):
+        self._subscribers.append((channel, callback))
+
+    async def listen(self):
+        delay = LISTEN_RETRY_SECONDS
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(*{channel for channel, _ in self._subscribers})
+                delay = LISTEN_RETRY_SECONDS
+                async for message in pubsub.listen():
+                    self._deliver(message)
+                logger.warning("Cache invalidation subscription ended; resubscribing in %.1fs", delay)
+            except Exception:  # `redis.ConnectionError`, `TimeoutError`, ... (the package is optional, so not named here)
+                logger.exception("Cache invalidation subscription failed; resubscribing in %.1fs", delay)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass  # The connection is already gone
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX_SECONDS)
+
+    def _deliver(self, message: dict):
+        if message["type"] != "message":
+            return
+        channel, data = (value.decode() if isinstance(value, bytes) else value for value in (message["channel"], message["data"]))
+        for subscribed_channel, callback in self._subscribers:
+            if subscribed_channel == channel:
+                try:
+                    callback(data)
+                except Exception:  # One bad message must not cost the subscription
+                    logger.exception("Cache invalidation message %r could not be handled", data)
+
+
+class SharedCache:
+    """
+    The L2 tier plus the invalidation protocol.
+    - `fetch(key, load, encode, decode, ttl)`: shared value for `key`, or `load()` stored there for `ttl` seconds.
+    - `invalidate(*keys)`: deletes the shared entries and tells the other workers to drop theirs.
+    - `on_invalidate(prefix, drop)`: how this worker drops a local entry; `drop(key)` runs for every
+      invalidated key starting with `prefix` that another worker published.
+    - `bump(name)` / `version(name)`: a shared version of data too large to cache, such as post listings.
+      Versions are random tokens rather than counters, so a flushed or restarted Redis can never hand out
+      a version some client already holds an ETag for.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.worker_id = uuid.uuid4().hex
+        self._handlers = []  # (prefix, drop)
+        self._invalidations = 0
+        self._versions = {}  # name -> (read_at, version), dropped when another worker bumps it
+        self.stats = {}  # key prefix -> {"hits": n, "misses": n}
+        self.on_invalidate("version:", lambda key: self._versions.pop(key.removeprefix("version:"), None))
+        backend.subscribe(INVALIDATION_CHANNEL, self._receive)
+
+    async def fetch(self, key: str, load, encode, decode, ttl: float):
+        counts = self.stats.setdefault(key.split(":", 1)[0], {"hits": 0, "misses": 0})
+        value = await self.backend.get(key)
+        if value is not None:
+            counts["hits"] += 1
+            return decode(value)
+
+        counts["misses"] += 1
+        invalidations = self._invalidations
+        loaded = await load()
+        if invalidations == self._invalidations:  # Don't share a value some write has already replaced
+            await self.backend.set(key, encode(loaded), ex=ttl)
+        return loaded
+
+    async def invalidate(self, *keys: str):
+        self._invalidations += 1
+        await self.backend.delete(*keys)
+        await self.backend.publish(INVALIDATION_CHANNEL, json.dumps({"sender": self.worker_id, "keys": keys}))
+
+    async def bump(self, name: str) -> str:
+        self._invalidations += 1
+        version = uuid.uuid4().hex
+        await self.backend.set(f"version:{name}", version)
+        self._versions[name] = (time.monotonic(), version)
+        await self.backend.publish(INVALIDATION_CHANNEL, json.dumps({"sender": self.worker_id, "keys": [f"version:{name}"]}))
+        return self._expiring(version)
+
+    async def version(self, name: str) -> str:
+        read_at, version = self._versions.get(name, (None, None))
+        if read_at is None or time.monotonic() - read_at >= VERSION_CACHE_SECONDS:
+            await self.backend.set(f"version:{name}", uuid.uuid4().hex, nx=True)  # First use (or after a flush)
+            version = await self.backend.get(f"version:{name}")
+            version = version.decode() if isinstance(version, bytes) else version
+            self._versions[name] = (time.monotonic(), version)
+        return self._expiring(version)
+
+    def on_invalidate(self, prefix: str, drop):
+        self._handlers.append((prefix, drop))
+
+    async def listen(self):
+        await self.backend.listen()
+
+    def clear(self):
+        """Forgets every shared value and the versions this worker last read (tests; memory backend only)."""
+        self.backend.clear()
+        self._versions.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "tiers": {
+                prefix: dict(counts, hit_ratio=hit_ratio(counts["hits"], counts["misses"]))
+                for prefix, counts in self.stats.items()
+            },
+        }
+
+    def _expiring(self, version: str) -> str:
+        """`version` plus the current `version_seconds` period, when the backend has one."""
+        seconds = self.backend.version_seconds
+        return f"{version}.{int(time.time() // seconds)}" if seconds else version
+
+    def _receive(self, message: str):
+        payload = json.loads(message)
+        if payload["sender"] == self.worker_id:
+            return  # Our own write already updated our local caches
+        self._invalidations += 1
+        for key in payload["keys"]:
+            for prefix, drop in self._handlers:
+                if key.startswith(prefix):
+                    drop(key)
+
+
+def backend_from_env():
+    if CACHE_BACKEND == "redis":
+        return RedisBackend(REDIS_URL)
+    if CACHE_BACKEND == "memory":
+        return MemoryBackend()
+    raise RuntimeError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r} (expected 'memory' or 'redis')")
+
+
+shared_cache = SharedCache(backend_from_env())
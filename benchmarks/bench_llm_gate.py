@@ -0,0 +1,83 @@
+"""
+What concurrent AI tutor chats cost the rest of the worker: thread offload vs async client + gate.
+
+Starts `--chats` generations at once against a fake model that takes `--seconds` per answer:
+- `threads`: the old path, `asyncio.to_thread(model.generate_content, ...)`, one executor thread per chat
+- `async`: `generate_content_async` behind `ConcurrencyGate(--limit, --queue)`, as `/chat_ws` does now
+While they run, it times a stand-in for other work that needs the default executor (a no-op
+`asyncio.to_thread` call every 50 ms) and samples the thread count and the event-loop lag.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_llm_gate.py --chats 200 --seconds 2
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from app.concurrency import ConcurrencyGate, GateFull
+from app.metrics import LoopLagMonitor
+
+
+async def probe(samples: list, threads: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.to_thread(lambda: None)
+        samples.append(time.perf_counter() - start)
+        threads.append(threading.active_count())
+        await asyncio.sleep(0.05)
+
+
+async def run(mode: str, chats: int, seconds: float, limit: int, queue: int) -> dict:
+    gate = ConcurrencyGate(limit, queue)
+    rejected = 0
+
+    async def chat():
+        nonlocal rejected
+        if mode == "threads":
+            await asyncio.to_thread(time.sleep, seconds)  # A blocking client holds its thread for the whole call
+            return
+        try:
+            async with gate.slot():
+                await asyncio.sleep(seconds)
+        except GateFull:
+            rejected += 1
+
+    lag, samples, threads, stop = LoopLagMonitor(interval=0.05), [], [], asyncio.Event()
+    monitors = [asyncio.create_task(lag.run()), asyncio.create_task(probe(samples, threads, stop))]
+    start = time.perf_counter()
+    await asyncio.gather(*(chat() for _ in range(chats)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for task in monitors:
+        task.cancel()
+
+    return {
+        "elapsed_s": elapsed,
+        "rejected": rejected,
+        "peak_threads": max(threads, default=threading.active_count()),
+        "probe_p50_ms": statistics.median(samples) * 1000 if samples else 0.0,
+        "probe_max_ms": max(samples, default=0.0) * 1000,
+        "loop_lag_max_ms": lag.snapshot()["max_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--queue", type=int, default=32)
+    args = parser.parse_args()
+
+    for mode in ("threads", "async"):
+        result = asyncio.run(run(mode, args.chats, args.seconds, args.limit, args.queue))
+        print(
+            f"{mode:7} elapsed={result['elapsed_s']:6.1f}s rejected={result['rejected']:3} peak_threads={result['peak_threads']:3} "
+            f"executor_probe p50={result['probe_p50_ms']:7.1f}ms max={result['probe_max_ms']:7.1f}ms loop_lag_max={result['loop_lag_max_ms']:5.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
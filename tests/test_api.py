@@ -7,9 +7,10 @@ import pytest
 import uuid
 import os
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from app.main import app
-from app.database import SessionLocal, Base, engine
+from app.database import SessionLocal, Base, engine, async_engine
 from app.main import CSRF_TOKEN
 
 def test_check_env():
@@ -682,3 +683,40 @@ def test_comments_api(client: TestClient, db_session: Session, csrf_token: str =
 
 
 
+
+
+def test_write_validation_round_trips(client: TestClient, db_session: Session, csrf_token: str = CSRF_TOKEN):
+    """Writes validate every referenced ID in one statement, insert with RETURNING, and keep the error precedence."""
+    user_data = {"id": str(uuid.uuid4()), "email": "trips@example.com", "userName": "tripsuser", "name": "Trips User", "imageUrl": "https://example.com/trips.jpg"}
+    assert client.post("/create_user", json=user_data, headers={"CSRF-Token": csrf_token}).status_code == 200
+    topic_id = client.post("/create_topic", json={"name": "Round Trips"}, headers={"CSRF-Token": csrf_token}).json()["id"]
+    course_id = client.post("/create_course", json={"name": "Latency", "topic_id": topic_id}, headers={"CSRF-Token": csrf_token}).json()["id"]
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    post_data = {"course_id": course_id, "author_id": user_data["id"], "title": "Fewer trips", "preview_md": "Preview content", "content_md": "Full content here"}
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        response = client.post("/create_post", json=post_data, headers={"CSRF-Token": csrf_token})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+    assert response.status_code == 200
+    assert response.json()["id"] and response.json()["created_at"]
+    assert response.json()["content_md"] == "Full content here"
+    assert statements == ["SELECT", "INSERT", "INSERT"]  # The post, then its body in `post_contents`
+
+    # A missing course is reported before a missing author, as before
+    bad_post = dict(post_data, course_id=999999, author_id="missing-author")
+    response = client.post("/create_post", json=bad_post, headers={"CSRF-Token": csrf_token})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Course not found"
+
+    response = client.post("/create_post", json=dict(post_data, author_id="missing-author"), headers={"CSRF-Token": csrf_token})
+    assert response.json()["detail"] == "Author not found"
+
+    response = client.post("/add_comment", json={"post_id": "missing-post", "content": "Hello"}, headers={"CSRF-Token": csrf_token, "User-ID": "missing-user"})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import pytest
+from app.concurrency import ConcurrencyGate, GateFull
+
+
+def test_slots_queue_and_rejection():
+    """Callers beyond `limit` wait in line and learn their position; beyond `max_waiting` they are turned away."""
+    gate = ConcurrencyGate(limit=2, max_waiting=2)
+    order, positions = [], []
+
+    async def call(name: str, seconds: float):
+        async def queued(position):
+            positions.append((name, position))
+        try:
+            async with gate.slot(on_queued=queued):
+                order.append(name)
+                await asyncio.sleep(seconds)
+        except GateFull:
+            order.append(f"{name} rejected")
+
+    async def main():
+        tasks = [asyncio.create_task(call(name, 0.05)) for name in "abcde"]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a", "b", "e rejected", "c", "d"]  # First come, first served
+    assert positions == [("c", 1), ("d", 2)]
+    stats = gate.snapshot()
+    assert (stats["active"], stats["waiting"], stats["admitted"], stats["rejected"], stats["peak_waiting"]) == (0, 0, 4, 1, 2)
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    gate = ConcurrencyGate(limit=1, max_waiting=2)
+    entered = []
+
+    async def call(name: str):
+        async with gate.slot():
+            entered.append(name)
+            await asyncio.sleep(0.05)
+
+    async def main():
+        holder = asyncio.create_task(call("holder"))
+        await asyncio.sleep(0)
+        quitter = asyncio.create_task(call("quitter"))
+        patient = asyncio.create_task(call("patient"))
+        await asyncio.sleep(0.01)
+        quitter.cancel()
+        await asyncio.gather(holder, patient)
+        with pytest.raises(asyncio.CancelledError):
+            await quitter
+
+    asyncio.run(main())
+    assert entered == ["holder", "patient"]
+    assert gate.snapshot()["active"] == 0
+
+
+def test_slot_is_handed_over_across_event_loops():
+    """A waiter on one loop is woken by a holder releasing on another (each test client connection has its own loop)."""
+    gate = ConcurrencyGate(limit=1, max_waiting=1)
+    held, events = threading.Event(), []
+
+    async def hold():
+        async with gate.slot():
+            held.set()
+            await asyncio.sleep(0.1)
+            events.append("released")
+
+    async def wait():
+        held.wait()
+        async with gate.slot():
+            events.append("entered")
+
+    holder = threading.Thread(target=asyncio.run, args=(hold(),))
+    holder.start()
+    asyncio.run(wait())
+    holder.join()
+    assert events == ["released", "entered"]
+    assert gate.snapshot()["queue_wait"]["max_ms"] >= 50
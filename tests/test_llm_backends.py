@@ -0,0 +1,95 @@
+import asyncio
+import json
+import pytest
+import time
+import app.llm as llm
+from app.llm import CassetteBackend, FakeBackend, GeminiBackend
+
+
+def collect(backend, prompt: str) -> list[str]:
+    async def run():
+        return [text async for text in backend.stream(prompt)]
+    return asyncio.run(run())
+
+
+def test_fake_answers_are_deterministic_and_paced():
+    fake = FakeBackend(tokens=20, first_token_ms=100, tokens_per_second=100, chunk_tokens=5)
+
+    start = time.perf_counter()
+    chunks = collect(fake, "Explain gradient descent")
+    elapsed = time.perf_counter() - start
+
+    assert len(chunks) == 4
+    assert len("".join(chunks).split()) == 20
+    assert set("".join(chunks).rstrip(".").split()) <= {"Explain", "gradient", "descent"}
+    assert 0.28 <= elapsed < 1.0  # 100 ms before the first token, then 20 tokens at 100 per second
+    assert collect(fake, "Explain gradient descent") == chunks
+    assert collect(fake, "Explain backpropagation") != chunks
+    assert asyncio.run(fake.complete("Explain gradient descent")) == "".join(chunks)
+
+
+def test_fake_streams_a_given_answer_as_is():
+    fake = FakeBackend("Line one\n\nline two ", first_token_ms=0, tokens_per_second=0, chunk_tokens=1)
+    assert collect(fake, "anything") == ["Line ", "one\n\n", "line ", "two "]
+
+
+def test_cassette_records_then_replays(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    recorder = FakeBackend(tokens=12, first_token_ms=50, tokens_per_second=200, chunk_tokens=4)
+
+    recording = CassetteBackend(path, recorder=recorder)
+    recorded = collect(recording, "What is a tensor?")
+    assert recorded == collect(recorder, "What is a tensor?")
+    assert collect(recording, "What is a tensor?") == recorded  # Now answered from the cassette
+    assert len(path.read_text().splitlines()) == 1
+    assert "What is a tensor?" not in path.read_text()  # Only a fingerprint of the prompt is stored
+
+    replay = CassetteBackend(path)
+    start = time.perf_counter()
+    assert collect(replay, "What is a tensor?") == recorded
+    assert time.perf_counter() - start >= 0.07  # With the recorded timing (50 ms, then 3 x 20 ms)
+
+    start = time.perf_counter()
+    assert asyncio.run(CassetteBackend(path, realtime=False).complete("What is a tensor?")) == "".join(recorded)
+    assert time.perf_counter() - start < 0.05
+
+
+def test_cassette_without_recorder_rejects_unknown_prompts(tmp_path):
+    with pytest.raises(LookupError):
+        collect(CassetteBackend(tmp_path / "empty.jsonl"), "Never recorded")
+
+
+def test_interrupted_recording_is_not_kept(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    cassette = CassetteBackend(path, recorder=FakeBackend(tokens=10, first_token_ms=0, tokens_per_second=0, chunk_tokens=2))
+
+    async def first_chunk_only():
+        chunks = cassette.stream("Cut short")
+        first = await anext(chunks)
+        await chunks.aclose()
+        return first
+
+    asyncio.run(first_chunk_only())
+    assert len(cassette) == 0 and not path.exists()
+
+
+def test_gemini_needs_a_key_only_when_used(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    backend = GeminiBackend()  # Constructing it (and importing the app) works offline
+    with pytest.raises(RuntimeError, match="GEMINI_API_KEY"):
+        asyncio.run(backend.complete("Hello"))
+
+
+def test_backend_from_env(monkeypatch, tmp_path):
+    assert isinstance(llm.backend_from_env("fake"), FakeBackend)
+    assert isinstance(llm.backend_from_env("gemini"), GeminiBackend)
+
+    path = tmp_path / "cassette.jsonl"
+    path.write_text(json.dumps({"prompt": "abc", "chunks": [[0, "Hi"]]}) + "\n")
+    monkeypatch.setattr(llm, "LLM_CASSETTE", str(path))
+    monkeypatch.setattr(llm, "LLM_CASSETTE_RECORD", "fake")
+    cassette = llm.backend_from_env("cassette")
+    assert len(cassette) == 1 and isinstance(cassette.recorder, FakeBackend)
+
+    with pytest.raises(RuntimeError, match="Unknown LLM_BACKEND"):
+        llm.backend_from_env("openai")